@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Benchmark of the recursive visitor against the explicit stack evaluator.
+
+Evaluates the left-leaning chain `a + a - a * a / a + ...` of each depth
+with the 'tree' engine, which recurses through `NodeVisitor.visit`, and with
+the 'stack' engine. The recursive visitor is given the recursion limit the
+depth needs, up to `--max-recursion`, and reported as failing beyond it.
+
+    python benchmarks/deep.py [--depths N ...] [--number N]
+'''
+import argparse
+import sys
+import timeit
+
+from tinypascal import Lexer, Parser
+from tinypascal.interpreter import compile_program
+
+
+def build_tree(depth):
+    ops = '+-*/'
+    terms = ['a']
+    for i in range(depth):
+        terms.append('{} a'.format(ops[i % 4]))
+    text = 'BEGIN a := 3; x := {} END.'.format(' '.join(terms))
+    return Parser(Lexer(text, scanner='regex'), iterative=True).parse()
+
+
+def best_time(program, number):
+    return min(timeit.repeat(
+        lambda: program.execute({}), number=number, repeat=3
+    )) / number
+
+
+def main():
+    argp = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argp.add_argument('--depths', type=int, nargs='+',
+                      default=[100, 1000, 10000, 100000, 1000000])
+    argp.add_argument('--number', type=int, default=5)
+    argp.add_argument('--max-recursion', type=int, default=50000,
+                      help='highest recursion limit given to the visitor')
+    args = argp.parse_args()
+
+    print('{:>9} {:>14} {:>14} {:>8}'.format(
+        'depth', 'recursive ms', 'stack ms', 'speedup'
+    ))
+    limit = sys.getrecursionlimit()
+    for depth in args.depths:
+        tree = build_tree(depth)
+        stack = best_time(compile_program(tree, 'stack'), args.number)
+
+        # each level of the chain takes two frames of `visit` and
+        # `visit_BinOp`
+        needed = 2 * depth + 100
+        recursive = None
+        if needed <= args.max_recursion:
+            sys.setrecursionlimit(max(limit, needed))
+            try:
+                recursive = best_time(
+                    compile_program(tree, 'tree'), args.number
+                )
+            except RecursionError:
+                pass
+            finally:
+                sys.setrecursionlimit(limit)
+
+        if recursive is None:
+            print('{:>9} {:>14} {:>14.3f} {:>8}'.format(
+                depth, 'fails', stack * 1000, '-'
+            ))
+        else:
+            print('{:>9} {:>14.3f} {:>14.3f} {:>7.2f}x'.format(
+                depth, recursive * 1000, stack * 1000, recursive / stack
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Micro-benchmark of `NodeVisitor.visit` dispatch.
+
+Compares the original per-call `getattr` dispatch with the cached
+per-class dispatch table by evaluating a deep expression tree.
+
+    python benchmarks/dispatch.py [--depth N] [--number N]
+'''
+import argparse
+import timeit
+
+from tinypascal import Lexer, Parser, Interpreter
+
+
+class GetattrInterpreter(Interpreter):
+    '''Interpreter using the original, uncached dispatch.
+    '''
+    def visit(self, node):
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+
+def build_tree(depth):
+    '''Returns the tree for `BEGIN x := 1 + 2 * -3 - 4 / 5 + ... END.`
+    where the outermost left-leaning chain is `depth` operators deep.
+    '''
+    ops = '+-*/'
+    terms = ['1']
+    for i in range(depth):
+        terms.append('{} {}{}'.format(ops[i % 4], '-' * (i % 2), i + 2))
+    text = 'BEGIN x := {} END.'.format(' '.join(terms))
+    return Parser(Lexer(text, scanner='regex')).parse()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--depth', type=int, default=200)
+    parser.add_argument('--number', type=int, default=500)
+    args = parser.parse_args()
+
+    tree = build_tree(args.depth)
+    results, scopes = {}, []
+    for label, cls in [('getattr', GetattrInterpreter),
+                       ('cached', Interpreter)]:
+        interpreter = cls(None)
+        results[label] = min(timeit.repeat(
+            lambda: interpreter.visit(tree), number=args.number, repeat=5
+        ))
+        scopes.append(interpreter.GLOBAL_SCOPE)
+        print('{:<8} {:8.3f} ms / run'.format(
+            label, 1000 * results[label] / args.number
+        ))
+    assert scopes[0] == scopes[1]
+    print('speedup  {:8.2f}x'.format(results['getattr'] / results['cached']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Load test of the evaluation server.
+
+Starts `python -m tinypascal serve` on a temporary Unix socket, then has
+`--clients` threads each send `--requests` programs, `--window` of them in
+flight at a time, and reports the throughput along with the server's
+request counts and latency percentiles.
+
+    python benchmarks/loadtest.py [--clients N] [--requests N] [--workers N]
+'''
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from tinypascal.client import Client
+
+
+# A few distinct programs, so the workers' caches are exercised, each run
+# with varying bindings.
+PROGRAMS = [
+    'BEGIN b := a * a; c := b - a / 2 END.',
+    'BEGIN x := (a + 1) * (a - 1); y := -x + a * 3 END.',
+    'BEGIN BEGIN p := a; q := p * p * p END; r := q / (a + 1) END.',
+    'BEGIN s := a; s := s + a; s := s + a; s := s * 2 END.',
+]
+
+
+def connect(path, timeout=10.0):
+    '''Connects to the server at `path`, waiting for it to start.
+    '''
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return Client(path)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def run_client(path, requests, window, engine, results):
+    programs = [(PROGRAMS[i % len(PROGRAMS)], {'a': i})
+                for i in range(requests)]
+    with connect(path) as client:
+        responses = client.evaluate_many(programs, engine, window)
+    results.append(sum(1 for response in responses if response['error']))
+
+
+def main():
+    argp = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argp.add_argument('--clients', type=int, default=8)
+    argp.add_argument('--requests', type=int, default=2000,
+                      help='requests sent by each client')
+    argp.add_argument('--window', type=int, default=32,
+                      help='requests in flight per client')
+    argp.add_argument('--workers', type=int, default=os.cpu_count())
+    argp.add_argument('--engine', default='vm')
+    args = argp.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tinypascal.sock')
+    server = subprocess.Popen([
+        sys.executable, '-m', 'tinypascal', 'serve', '--socket', path,
+        '--workers', str(args.workers), '--engine', args.engine
+    ])
+    try:
+        connect(path).close()
+        results = []
+        threads = [
+            threading.Thread(target=run_client, args=(
+                path, args.requests, args.window, args.engine, results
+            )) for _ in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with connect(path) as client:
+            stats = client.stats()
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+        if os.path.exists(path):
+            os.unlink(path)
+        os.rmdir(directory)
+
+    total = args.clients * args.requests
+    print('{} requests from {} clients in {:.2f}s: {:.0f} requests/s, '
+          '{} errors'.format(total, args.clients, elapsed, total / elapsed,
+                             sum(results)))
+    latency = stats['latency']
+    print('server: {} requests, {} workers, latency p50 {:.2f}ms, '
+          'p90 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms'.format(
+              stats['requests'], stats['workers'], latency['p50'] * 1000,
+              latency['p90'] * 1000, latency['p99'] * 1000,
+              latency['max'] * 1000
+          ))
+
+
+if __name__ == '__main__':
+    main()
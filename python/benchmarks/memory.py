@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Memory benchmark of the token and AST node representation.
+
+Parses the same generated program with the slotted classes shipped in
+`tinypascal` and with `__dict__` based replicas of the original classes,
+and reports the bytes allocated per token and node.
+
+    python benchmarks/memory.py [--statements N]
+'''
+import argparse
+import gc
+import tracemalloc
+from unittest import mock
+
+from tinypascal import Lexer, Parser
+from tinypascal import lexer, parser
+
+
+class Token:
+    def __init__(self, type, value):
+        self.type = type
+        self.value = value
+
+
+class BinOp:
+    def __init__(self, left, op, right):
+        self.left = left
+        self.token = self.op = op
+        self.right = right
+
+
+class UnaryOp:
+    def __init__(self, op, expr):
+        self.token = self.op = op
+        self.expr = expr
+
+
+class Num:
+    def __init__(self, token):
+        self.token = token
+        self.value = token.value
+
+
+class Compound:
+    def __init__(self):
+        self.children = []
+
+
+class Assign:
+    def __init__(self, left, op, right):
+        self.left = left
+        self.token = self.op = op
+        self.right = right
+
+
+class Var:
+    def __init__(self, token):
+        self.token = token
+        self.value = token.value
+
+
+class NoOp:
+    pass
+
+
+def make_program(statements):
+    return 'BEGIN {} END.'.format('; '.join(
+        'x{0} := -{0} * (y + {0}) - z / 7'.format(i)
+        for i in range(statements)
+    ))
+
+
+def count_objects(tree):
+    '''Counts the AST nodes and distinct tokens reachable from `tree`.
+    '''
+    nodes, tokens, pending = 0, set(), [tree]
+    while pending:
+        node = pending.pop()
+        nodes += 1
+        for name in ('token', 'op'):
+            if hasattr(node, name):
+                tokens.add(id(getattr(node, name)))
+        for name in ('left', 'right', 'expr'):
+            if hasattr(node, name):
+                pending.append(getattr(node, name))
+        pending.extend(getattr(node, 'children', ()))
+    return nodes, len(tokens)
+
+
+def measure(text):
+    gc.collect()
+    tracemalloc.start()
+    tree = Parser(Lexer(text, scanner='regex')).parse()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, count_objects(tree)
+
+
+def main():
+    argp = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argp.add_argument('--statements', type=int, default=20000)
+    args = argp.parse_args()
+
+    text = make_program(args.statements)
+    legacy = dict(
+        (name, globals()[name]) for name in
+        ('BinOp', 'UnaryOp', 'Num', 'Compound', 'Assign', 'Var', 'NoOp')
+    )
+    with mock.patch.multiple(parser, **legacy), \
+            mock.patch.object(lexer, 'Token', Token):
+        before, _ = measure(text)
+    after, (nodes, tokens) = measure(text)
+
+    print('{} nodes, {} tokens'.format(nodes, tokens))
+    for label, size in [('before', before), ('after', after)]:
+        print('{:<8} {:8.1f} bytes / node  ({:.1f} MiB)'.format(
+            label, size / nodes, size / 2 ** 20
+        ))
+    print('saving   {:8.1%}'.format(1 - after / before))
+
+
+if __name__ == '__main__':
+    main()
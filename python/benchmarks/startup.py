@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Startup benchmark of `import tinypascal` and `python -m tinypascal`.
+
+Reports the `python -X importtime` breakdown of importing the package, the
+wall time of running a trivial program through `python -m tinypascal`
+against that of a bare interpreter, and the heavy modules loaded on the
+way. With `--check`, exits with status 1 when a figure is over the budget
+tracked in `startup_budget.json`, which the test suite enforces as well.
+
+    python benchmarks/startup.py [--runs N] [--top N] [--check]
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'startup_budget.json')
+
+PROGRAM = b'BEGIN a := 1; b := a + 2 END.\n'
+
+
+def load_budget(path=BUDGET_PATH):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def import_times():
+    '''Returns `(module, self_us, cumulative_us)` for every module imported
+    by `import tinypascal` in a fresh interpreter, in import order.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import tinypascal'],
+        stderr=subprocess.PIPE, check=True, universal_newlines=True
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        times.append((module.strip(), int(own), int(cumulative)))
+    return times
+
+
+def loaded_modules(code):
+    '''Returns the names of the modules loaded after running `code` in a
+    fresh interpreter, with `PROGRAM` on its stdin.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-c',
+         code + "\nimport sys; sys.stderr.write('\\n'.join(sys.modules))"],
+        input=PROGRAM, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        check=True
+    )
+    return process.stderr.decode('utf-8').split('\n')
+
+
+def wall_time(argv, runs, stdin=None):
+    '''Returns the fastest wall time of `runs` runs of `argv`, in seconds.
+    '''
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(argv, input=stdin, stdout=subprocess.DEVNULL,
+                       check=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(runs=10):
+    times = import_times()
+    bare = wall_time([sys.executable, '-c', 'pass'], runs)
+    run = wall_time([sys.executable, '-m', 'tinypascal'], runs, PROGRAM)
+    modules = set(loaded_modules('import tinypascal')) | set(
+        loaded_modules('import tinypascal; tinypascal.main([])')
+    )
+    return {
+        'import_ms': dict(
+            (module, cumulative) for module, _, cumulative in times
+        ).get('tinypascal', 0) / 1000,
+        'bare_ms': bare * 1000,
+        'run_ms': run * 1000,
+        'run_overhead_ms': (run - bare) * 1000,
+        'modules': sorted(modules),
+        'imports': times,
+    }
+
+
+def over_budget(results, budget):
+    '''Returns a description of each figure of `results` over `budget`.
+    '''
+    problems = []
+    for key in ('import_ms', 'run_overhead_ms'):
+        if results[key] > budget[key]:
+            problems.append('{} {:.1f} > {}'.format(
+                key, results[key], budget[key]
+            ))
+    for module in budget['forbidden_modules']:
+        if module in results['modules']:
+            problems.append('imports {}'.format(module))
+    return problems
+
+
+def main():
+    argp = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argp.add_argument('--runs', type=int, default=10)
+    argp.add_argument('--top', type=int, default=15,
+                      help='number of slowest imports to list')
+    argp.add_argument('--check', action='store_true',
+                      help='exit with status 1 when over budget')
+    args = argp.parse_args()
+
+    results = measure(args.runs)
+    print('{:>10} {:>10}  module'.format('self ms', 'cumul. ms'))
+    slowest = sorted(results['imports'], key=lambda item: -item[2])
+    for module, own, cumulative in slowest[:args.top]:
+        print('{:>10.2f} {:>10.2f}  {}'.format(
+            own / 1000, cumulative / 1000, module
+        ))
+    print()
+    print('import tinypascal     {:8.1f} ms'.format(results['import_ms']))
+    print('python -c pass        {:8.1f} ms'.format(results['bare_ms']))
+    print('python -m tinypascal  {:8.1f} ms  (+{:.1f} ms)'.format(
+        results['run_ms'], results['run_overhead_ms']
+    ))
+
+    problems = over_budget(results, load_budget())
+    for problem in problems:
+        print('over budget: {}'.format(problem))
+    if args.check and problems:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,9 @@ def openfile(fname):
 
 
 requirements = [ ]
+extra_requirements = {
+    'numpy': ['numpy'],
+}
 setup_requirements = [ ]
 test_requirements = ['pytest', ]
 
@@ -36,6 +39,7 @@ setup(
     packages=find_packages('src', exclude=['tests']),
     package_dir={'': 'src'},
     install_requires=requirements,
+    extras_require=extra_requirements,
     setup_requires=setup_requirements,
     tests_require=test_requirements,
     test_suite='tests',
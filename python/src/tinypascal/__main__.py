@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
+import sys
 from tinypascal import main
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
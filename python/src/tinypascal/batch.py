@@ -0,0 +1,74 @@
+'''Runs one program over many initial variable bindings.
+'''
+from .interpreter import compile_program
+from .lexer import Lexer
+from .parser import Parser
+
+
+class BatchRunner:
+    '''Parses and compiles `program` once, then runs it against any number
+    of initial scopes.
+
+    `program` is either the source text or an already parsed tree; with a
+    `cache` (a `ProgramCache`) source text is looked up there instead of
+    being parsed again. A single working scope is reused for every run and
+    the initial scopes passed in are left untouched.
+    '''
+    def __init__(self, program, engine='closure', optimize=False, cache=None):
+        if isinstance(program, str) and cache is not None:
+            self.tree = cache.parse(program)
+            self.program = cache.compile(program, engine, optimize)
+        else:
+            if isinstance(program, str):
+                program = Parser(Lexer(program)).parse()
+            self.tree = program
+            if optimize:
+                from .optimizer import fold_constants
+                program, _ = fold_constants(program)
+            self.program = compile_program(program, engine)
+        self.scope = {}
+
+    def iter_run(self, scopes, select=None):
+        '''Yields the final scope of each run, or only a dict of the `select`
+        variables, which are None when a run leaves them unbound.
+
+        Errors raised by a run propagate and end the iteration.
+        '''
+        scope, execute = self.scope, self.program.execute
+        for initial in scopes:
+            scope.clear()
+            scope.update(initial)
+            execute(scope)
+            if select is None:
+                yield dict(scope)
+            else:
+                yield {name: scope.get(name) for name in select}
+
+    def run(self, scopes, select=None):
+        '''Returns the results of `iter_run` as a list.
+        '''
+        return list(self.iter_run(scopes, select))
+
+    def run_columns(self, scopes, inputs=None, select=None):
+        '''Runs the program against each scope of the sequence `scopes`,
+        returning a dict of one column per variable assigned by the program,
+        or per `select` variable, holding its value after each run.
+
+        `inputs` maps the variables bound by the scopes to their type, see
+        `inference.infer_types`. The columns are allocated before running:
+        variables inferred to be ints go in an `array('q')`, floats in an
+        `array('d')` and the rest in lists, as do the columns of ints that
+        turn out not to fit 64 bits.
+        '''
+        from .inference import allocate_column, infer_types, store
+        info = infer_types(self.tree, inputs)
+        names = list(info.variables) if select is None else list(select)
+        types = dict(inputs or {}, **info.variables)
+        columns = [allocate_column(types.get(name), len(scopes))
+                   for name in names]
+        for index, values in enumerate(self.iter_run(scopes, names)):
+            for position, name in enumerate(names):
+                columns[position] = store(
+                    columns[position], index, values[name]
+                )
+        return dict(zip(names, columns))
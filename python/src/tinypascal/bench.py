@@ -0,0 +1,251 @@
+'''Benchmark suite timing the lexer, parser and engines on generated programs.
+
+    python -m tinypascal.bench [--workload NAME] [--scale N] [--engine NAME]
+                               [--output FILE] [--baseline FILE]
+
+Each workload generates a program stressing one dimension of the language:
+deeply nested expressions, long statement lists, many variables and deeply
+nested `BEGIN`/`END` blocks. The lexing, parsing and execution of every
+program are timed separately, keeping the fastest of `--repeat` runs, and
+the peak memory of a complete run is measured with `tracemalloc`.
+
+Results are written as JSON. Given a `--baseline` saved by an earlier run,
+phases that got slower by more than `--threshold` are reported as
+regressions and the command exits with status 1; baselines of another
+engine, scanner or Python version are refused with status 2.
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from .interpreter import ENGINES, compile_program
+from .lexer import SCANNERS, Lexer
+from .parser import Parser, walk
+
+
+OPERATORS = ['+', '-', '*', '/']
+
+PHASES = ('lex', 'parse', 'execute')
+
+# Results are only compared with baselines of the same settings.
+SETTINGS = ('engine', 'scanner', 'python')
+
+
+def deep_expression(depth):
+    '''An assignment of a single expression nested `depth` parentheses
+    deep.
+    '''
+    operands = ''.join(
+        ' {} {})'.format(OPERATORS[i % 4], i % 7 + 1) for i in range(depth)
+    )
+    return 'BEGIN x := {}1{} END.'.format('(' * depth, operands)
+
+
+def long_statements(count):
+    '''`count` assignments cycling over a handful of variables.
+    '''
+    statements = ['v{} := {}'.format(i, i + 1) for i in range(8)]
+    statements.extend(
+        'v{0} := (v{1} + v{2}) / 2 - -{3} * 3'.format(
+            i % 8, (i + 3) % 8, (i + 5) % 8, i % 11
+        ) for i in range(count)
+    )
+    return 'BEGIN {} END.'.format('; '.join(statements))
+
+
+def many_variables(count):
+    '''`count` distinct variables, each assigned once from the ones before.
+    '''
+    statements = ['var0 := 1']
+    statements.extend(
+        'var{} := var{} + var{} * 2'.format(i, i - 1, i // 2)
+        for i in range(1, count)
+    )
+    return 'BEGIN {} END.'.format(';\n'.join(statements))
+
+
+def nested_blocks(depth):
+    '''`depth` compound statements nested in each other, with an assignment
+    at every level.
+    '''
+    return '{}END.'.format(''.join(
+        'BEGIN n{0} := {0} + 1; '.format(i) for i in range(depth)
+    ) + 'END ' * (depth - 1))
+
+
+# name: (generator, default size); nested parentheses and blocks recurse in
+# the parser and in the tree walking engines, so their default sizes stay
+# well within the default recursion limit
+WORKLOADS = {
+    'deep_expression': (deep_expression, 100),
+    'long_statements': (long_statements, 5000),
+    'many_variables': (many_variables, 5000),
+    'nested_blocks': (nested_blocks, 100),
+}
+
+
+def best_time(function, repeat):
+    '''Returns the fastest of `repeat` timed calls and the last result.
+    '''
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(text, engine, scanner):
+    '''Peak bytes allocated while lexing, parsing and running `text`.
+    '''
+    tracemalloc.start()
+    try:
+        tree = Parser(Lexer(text, scanner=scanner)).parse()
+        compile_program(tree, engine).execute({})
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(text, engine='tree', scanner='char', repeat=5):
+    '''Times the phases of running `text` and returns a dict of the results.
+
+    Parsing is timed from an already lexed `TokenBuffer` and execution
+    from an already parsed, and for the compiling engines compiled,
+    program.
+    '''
+    lex, tokens = best_time(
+        lambda: Lexer(text, scanner=scanner).tokenize(), repeat
+    )
+    parse, tree = best_time(lambda: Parser(tokens).parse(), repeat)
+    program = compile_program(tree, engine)
+    execute, _ = best_time(lambda: program.execute({}), repeat)
+
+    nodes = sum(1 for _ in walk(tree))
+    return {
+        'tokens': len(tokens),
+        'nodes': nodes,
+        'lex': lex,
+        'parse': parse,
+        'execute': execute,
+        'tokens_per_second': len(tokens) / lex if lex else 0.0,
+        'nodes_per_second': nodes / parse if parse else 0.0,
+        'peak_memory': peak_memory(text, engine, scanner),
+    }
+
+
+def run(workloads=None, scale=1.0, engine='tree', scanner='char', repeat=5):
+    '''Measures each of the named `workloads`, all of them by default, with
+    their default sizes multiplied by `scale`.
+    '''
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine: {!r}'.format(engine))
+    results = {
+        'python': platform.python_version(),
+        'engine': engine,
+        'scanner': scanner,
+        'workloads': {},
+    }
+    for name in workloads or sorted(WORKLOADS):
+        generate, size = WORKLOADS[name]
+        size = max(1, int(size * scale))
+        result = measure(generate(size), engine, scanner, repeat)
+        result['size'] = size
+        results['workloads'][name] = result
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    '''Returns the phases of `results` slower than in `baseline` by more than
+    `threshold`, as `(workload, phase, baseline, current)` tuples.
+
+    Workloads are only compared when they were run at the same size, and
+    results of another engine, scanner or Python version not at all; a
+    `ValueError` says which differs.
+    '''
+    for setting in SETTINGS:
+        if results.get(setting) != baseline.get(setting):
+            raise ValueError('Baseline was run with {} {!r}, not {!r}'.format(
+                setting, baseline.get(setting), results.get(setting)
+            ))
+    regressions = []
+    for name, result in sorted(results['workloads'].items()):
+        previous = baseline.get('workloads', {}).get(name)
+        if previous is None or previous.get('size') != result['size']:
+            continue
+        for phase in PHASES:
+            if result[phase] > previous[phase] * (1 + threshold):
+                regressions.append(
+                    (name, phase, previous[phase], result[phase])
+                )
+    return regressions
+
+
+def format_results(results):
+    lines = ['{:<16} {:>7} {:>7} {:>9} {:>9} {:>9} {:>11} {:>10} {:>9}'.format(
+        'workload', 'tokens', 'nodes', 'lex ms', 'parse ms', 'exec ms',
+        'tokens/s', 'nodes/s', 'peak KiB'
+    )]
+    for name, result in sorted(results['workloads'].items()):
+        lines.append(
+            '{:<16} {:>7} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>11.0f} '
+            '{:>10.0f} {:>9.0f}'.format(
+                name, result['tokens'], result['nodes'],
+                result['lex'] * 1000, result['parse'] * 1000,
+                result['execute'] * 1000, result['tokens_per_second'],
+                result['nodes_per_second'], result['peak_memory'] / 1024
+            )
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argp = argparse.ArgumentParser(
+        prog='python -m tinypascal.bench',
+        description=__doc__.split('\n')[0]
+    )
+    argp.add_argument('-w', '--workload', action='append',
+                      choices=sorted(WORKLOADS),
+                      help='workload to run, may be repeated (default: all)')
+    argp.add_argument('--scale', type=float, default=1.0,
+                      help='multiplier of the default workload sizes')
+    argp.add_argument('--engine', choices=sorted(ENGINES), default='tree')
+    argp.add_argument('--scanner', choices=SCANNERS, default='char')
+    argp.add_argument('--repeat', type=int, default=5,
+                      help='runs per phase, the fastest is kept')
+    argp.add_argument('-o', '--output', help='file to write the results to')
+    argp.add_argument('--baseline', help='results of an earlier run')
+    argp.add_argument('--threshold', type=float, default=0.1,
+                      help='slowdown reported as a regression (default: 0.1)')
+    args = argp.parse_args(argv)
+
+    results = run(args.workload, args.scale, args.engine, args.scanner,
+                  args.repeat)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fp:
+            baseline = json.load(fp)
+        try:
+            regressions = compare(results, baseline, args.threshold)
+        except ValueError as ex:
+            sys.stderr.write('{}\n'.format(ex))
+            return 2
+        for name, phase, previous, current in regressions:
+            print('regression: {} {} {:.2f}ms -> {:.2f}ms ({:+.0%})'.format(
+                name, phase, previous * 1000, current * 1000,
+                current / previous - 1
+            ))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+'''Limits on the work a single run of a program may do.
+
+A `Budget` caps the number of steps a run takes (nodes visited by the
+'tree' engine, instructions executed by 'vm'), its wall-clock time and the
+size of the integers it computes, so one runaway program, say a chain of
+multiplications building a number of millions of digits, can't stall the
+process running it:
+
+    interpreter = Interpreter(parser, budget=Budget(max_steps=10 ** 6))
+
+A run going over any limit is stopped with `BudgetExceeded`. Only runs
+given a budget pay for the checks; the step count is compared to a single
+checkpoint per step and the clock is only read every `CLOCK_INTERVAL`
+steps.
+'''
+import time
+
+from .interpreter import Interpreter, compile_program
+from .lexer import TokenType
+
+
+# Steps taken between two looks at the clock.
+CLOCK_INTERVAL = 1024
+
+# Engines able to run on a budget.
+BUDGET_ENGINES = ('tree', 'vm')
+
+
+class BudgetExceeded(Exception):
+    '''Raised when a run goes over its `Budget`.
+
+    `limit` names the limit broken, 'steps', 'time' or 'bits', and `stats`
+    holds the `steps` taken and the `elapsed` seconds when the run was
+    stopped. The scope keeps what was assigned until then.
+    '''
+    def __init__(self, limit, stats):
+        super().__init__(limit, stats)
+        self.limit = limit
+        self.stats = stats
+
+    def __str__(self):
+        return '{} budget exceeded after {} steps'.format(
+            self.limit, self.stats['steps']
+        )
+
+
+class Budget:
+    '''Limits of a run: at most `max_steps` steps, `timeout` seconds and
+    integers of `max_bits` bits. None leaves a limit off.
+
+    Multiplications are checked before being computed, so a product over
+    `max_bits` is never built.
+    '''
+    def __init__(self, max_steps=None, timeout=None, max_bits=None):
+        for name, value in [('max_steps', max_steps), ('timeout', timeout),
+                            ('max_bits', max_bits)]:
+            if value is not None and value <= 0:
+                raise ValueError('{} must be positive: {!r}'.format(
+                    name, value
+                ))
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_bits = max_bits
+
+    def __repr__(self):
+        return 'Budget(max_steps={!r}, timeout={!r}, max_bits={!r})'.format(
+            self.max_steps, self.timeout, self.max_bits
+        )
+
+    def start(self):
+        '''Returns the `Meter` of a run starting now.
+        '''
+        return Meter(self)
+
+
+class Meter:
+    '''Tracks a single run against its `Budget`.
+
+    Engines count their steps themselves, starting from `steps`, and call
+    `check` once the count reaches `checkpoint`; they leave `steps` to the
+    count they reached, so a run may span several calls of an engine.
+    '''
+    def __init__(self, budget):
+        self.budget = budget
+        self.max_bits = budget.max_bits
+        self.started = time.monotonic()
+        self.deadline = None
+        if budget.timeout is not None:
+            self.deadline = self.started + budget.timeout
+        self.steps = 0
+        self.checkpoint = self.next_checkpoint(0)
+
+    def next_checkpoint(self, steps):
+        checkpoint = float('inf')
+        if self.deadline is not None:
+            checkpoint = steps + CLOCK_INTERVAL
+        if self.budget.max_steps is not None:
+            checkpoint = min(checkpoint, self.budget.max_steps + 1)
+        return checkpoint
+
+    def check(self, steps):
+        '''Raises `BudgetExceeded` if the run is over its step count or
+        deadline after `steps` steps, else returns the next checkpoint.
+        '''
+        self.steps = steps
+        max_steps = self.budget.max_steps
+        if max_steps is not None and steps > max_steps:
+            self.exceeded('steps')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceeded('time')
+        self.checkpoint = self.next_checkpoint(steps)
+        return self.checkpoint
+
+    def check_bits(self, value, steps):
+        '''Raises `BudgetExceeded` if `value` is an integer over the
+        budget's `max_bits`.
+        '''
+        if type(value) is int and value.bit_length() > self.max_bits:
+            self.steps = steps
+            self.exceeded('bits')
+
+    def check_product(self, left, right, steps):
+        '''Raises `BudgetExceeded` if `left * right` would be an integer
+        over the budget's `max_bits`, without computing it.
+        '''
+        if type(left) is int and type(right) is int and left and right:
+            # a product has as many bits as its factors together, or one
+            # bit less
+            if left.bit_length() + right.bit_length() - 1 > self.max_bits:
+                self.steps = steps
+                self.exceeded('bits')
+
+    def exceeded(self, limit):
+        raise BudgetExceeded(limit, self.stats())
+
+    def stats(self):
+        return {'steps': self.steps,
+                'elapsed': time.monotonic() - self.started}
+
+
+class BudgetedInterpreter(Interpreter):
+    '''Walks a tree like `Interpreter`, counting each node visited as a
+    step of `meter`.
+    '''
+    def __init__(self, meter, scope):
+        super().__init__(None)
+        self.meter = meter
+        self.GLOBAL_SCOPE = scope
+        self.steps = meter.steps
+        self.checkpoint = meter.checkpoint
+
+    def visit(self, node):
+        self.steps += 1
+        if self.steps >= self.checkpoint:
+            self.checkpoint = self.meter.check(self.steps)
+        try:
+            visitor = self._visitors[type(node)]
+        except KeyError:
+            visitor = self._resolve_visitor(type(node))
+        return visitor(self, node)
+
+    def visit_BinOp(self, node):
+        if self.meter.max_bits is None:
+            return super().visit_BinOp(node)
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        op = node.op.type
+        if op == TokenType.MUL:
+            self.meter.check_product(left, right, self.steps)
+            value = left * right
+        elif op == TokenType.PLUS:
+            value = left + right
+        elif op == TokenType.MINUS:
+            value = left - right
+        else:
+            return left / right
+        self.meter.check_bits(value, self.steps)
+        return value
+
+
+def run_budgeted(tree, meter, scope, engine='tree'):
+    '''Runs a parsed program against `scope` on one of the
+    `BUDGET_ENGINES`, raising `BudgetExceeded` once the run `meter` tracks
+    goes over its budget.
+    '''
+    if engine not in BUDGET_ENGINES:
+        raise ValueError('Budgets are not supported by the {!r} '
+                         'engine'.format(engine))
+    if engine == 'tree':
+        interpreter = BudgetedInterpreter(meter, scope)
+        try:
+            return interpreter.visit(tree)
+        finally:
+            meter.steps = interpreter.steps
+
+    from .vm import VM
+    return VM().execute(compile_program(tree, 'vm'), scope, meter)
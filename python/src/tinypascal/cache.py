@@ -0,0 +1,202 @@
+'''Cache of parsed and compiled programs keyed by a hash of their source.
+
+Entries live in an in-memory LRU tier and, when a directory is given, in an
+on-disk tier holding the AST of each program serialized by `dump_tree`.
+Files written by another version of tinypascal are ignored and replaced.
+'''
+import collections
+import hashlib
+import marshal
+import os
+
+from .interpreter import compile_program
+from .lexer import Lexer, PUNCTUATION, Token, TokenType
+from .parser import Assign, BinOp, Compound, NoOp, Num, Parser, UnaryOp, Var
+
+
+MAGIC = b'TPC\x01'
+
+# Tags of the serialized nodes; see `dump_tree`.
+NUM, VAR, BINOP, UNARYOP, ASSIGN, COMPOUND, NOOP = range(7)
+
+
+def dump_tree(tree):
+    '''Serializes an AST into compact bytes.
+
+    The nodes are flattened in post-order into a sequence of `tag, argument`
+    pairs (the value of a `Num`, the name of a `Var` or of an `Assign`
+    target, the operator of a `BinOp`/`UnaryOp`, the number of children of
+    a `Compound`) which `marshal` then encodes, the same way `.pyc` files
+    hold code objects. No recursion is involved, so any depth works.
+    '''
+    codes, pending = [], [(tree, False)]
+    while pending:
+        node, expanded = pending.pop()
+        if isinstance(node, Num):
+            codes += (NUM, node.value)
+        elif isinstance(node, Var):
+            codes += (VAR, node.value)
+        elif isinstance(node, NoOp):
+            codes += (NOOP, None)
+        elif expanded:
+            if isinstance(node, BinOp):
+                codes += (BINOP, node.op.value)
+            elif isinstance(node, UnaryOp):
+                codes += (UNARYOP, node.op.value)
+            elif isinstance(node, Assign):
+                codes += (ASSIGN, node.left.value)
+            else:
+                codes += (COMPOUND, len(node.children))
+        else:
+            pending.append((node, True))
+            if isinstance(node, (BinOp, Assign)):
+                pending.append((node.right, False))
+                if isinstance(node, BinOp):
+                    pending.append((node.left, False))
+            elif isinstance(node, UnaryOp):
+                pending.append((node.expr, False))
+            else:
+                pending.extend((child, False)
+                               for child in reversed(node.children))
+    return marshal.dumps(tuple(codes))
+
+
+def load_tree(data):
+    '''Rebuilds the AST serialized by `dump_tree`.
+    '''
+    codes, stack = marshal.loads(data), []
+    for i in range(0, len(codes), 2):
+        tag, arg = codes[i], codes[i + 1]
+        if tag == NUM:
+            stack.append(Num(Token(TokenType.INTEGER, arg)))
+        elif tag == VAR:
+            stack.append(Var(Token(TokenType.ID, arg)))
+        elif tag == BINOP:
+            right = stack.pop()
+            stack[-1] = BinOp(stack[-1], PUNCTUATION[arg], right)
+        elif tag == UNARYOP:
+            stack[-1] = UnaryOp(PUNCTUATION[arg], stack[-1])
+        elif tag == ASSIGN:
+            left = Var(Token(TokenType.ID, arg))
+            stack[-1] = Assign(left, PUNCTUATION[':='], stack[-1])
+        elif tag == COMPOUND:
+            node = Compound()
+            if arg:
+                node.children = stack[-arg:]
+                del stack[-arg:]
+            stack.append(node)
+        else:
+            stack.append(NoOp())
+    return stack.pop()
+
+
+class CacheEntry:
+
+    def __init__(self, tree):
+        self.tree = tree
+        # compiled forms of `tree` keyed by (engine, optimize)
+        self.programs = {}
+
+
+class ProgramCache:
+    '''Maps the SHA-256 of a program's source to its parsed and compiled
+    forms, keeping the `maxsize` most recently used programs in memory.
+
+    With a `directory`, parsed programs are also stored on disk so that a
+    new process starts with a warm cache.
+    '''
+    def __init__(self, maxsize=128, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        self._version = None
+
+    @property
+    def version(self):
+        if self._version is None:
+            from . import get_version
+            self._version = get_version().encode('utf-8')
+        return self._version
+
+    def key(self, text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.tpc')
+
+    def entry(self, text):
+        key = self.key(text)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        tree = self.read(key) if self.directory else None
+        if tree is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            tree = Parser(Lexer(text)).parse()
+            if self.directory:
+                self.write(key, tree)
+
+        entry = self.entries[key] = CacheEntry(tree)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return entry
+
+    def parse(self, text):
+        '''Returns the AST of `text`. It's shared by all callers asking for
+        the same program and must not be modified.
+        '''
+        return self.entry(text).tree
+
+    def compile(self, text, engine='tree', optimize=False):
+        '''Returns `text` compiled for `engine`, see `compile_program`.
+        '''
+        entry = self.entry(text)
+        program = entry.programs.get((engine, optimize))
+        if program is None:
+            tree = entry.tree
+            if optimize:
+                from .optimizer import fold_constants
+                tree, _ = fold_constants(tree)
+            program = compile_program(tree, engine)
+            entry.programs[(engine, optimize)] = program
+        return program
+
+    def read(self, key):
+        try:
+            with open(self.path(key), 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            return None
+
+        header = MAGIC + self.version + b'\n'
+        if not data.startswith(header):
+            return None
+        try:
+            return load_tree(data[len(header):])
+        except (EOFError, ValueError, TypeError, IndexError, KeyError):
+            return None
+
+    def write(self, key, tree):
+        # only needed with a cache directory, so kept off the startup path
+        import tempfile
+
+        header = MAGIC + self.version + b'\n'
+        data = dump_tree(tree)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(header + data)
+            os.replace(tmp, self.path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,262 @@
+'''Command line interface behind `python -m tinypascal <command>`.
+'''
+import argparse
+import os
+import sys
+import time
+
+from .interpreter import ENGINES
+
+
+# Results written to stdout at a time by the batch command.
+OUTPUT_LINES = 256
+
+# Characters read at a time from NUL-delimited stdin.
+READ_SIZE = 64 * 1024
+
+
+def run_parallel_command(args):
+    from .parallel import encode_result, run_parallel
+
+    sources = []
+    for path in args.paths:
+        with open(path, encoding='utf-8') as fp:
+            sources.append(fp.read())
+
+    def progress(done, total):
+        sys.stderr.write('\r{}/{} programs'.format(done, total))
+
+    results, stats = run_parallel(
+        sources, engine=args.engine, max_workers=args.workers,
+        chunksize=args.chunksize, progress=None if args.quiet else progress
+    )
+    errors = 0
+    for path, result in zip(args.paths, results):
+        line, error = encode_result({
+            'path': path, 'scope': result.scope, 'error': result.error
+        })
+        errors += error is not None
+        sys.stdout.write(line + '\n')
+    sys.stderr.write(
+        '{}{} programs, {} errors in {:.3f}s ({:.0f} programs/s, '
+        '{} workers)\n'.format(
+            '' if args.quiet else '\n', stats.programs, errors,
+            stats.elapsed, stats.throughput, stats.workers
+        )
+    )
+    return 1 if errors else 0
+
+
+def run_profile_command(args):
+    from .profiling import Profile, run_profiled
+
+    with open(args.path, encoding='utf-8') as fp:
+        text = fp.read()
+    profile = Profile()
+    try:
+        run_profiled(text, profile, engine=args.engine)
+    except Exception as ex:
+        sys.stderr.write('{}: {}\n'.format(type(ex).__name__, ex))
+        status = 1
+    else:
+        status = 0
+
+    if args.collapsed:
+        with open(args.collapsed, 'w', encoding='utf-8') as fp:
+            profile.write_collapsed(fp)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            fp.write(profile.to_json(args.variables, indent=2) + '\n')
+    else:
+        sys.stdout.write(profile.to_json(args.variables, indent=2) + '\n')
+    return status
+
+
+def iter_paths(paths, suffix):
+    '''Yields each of `paths`, with directories replaced by the files with
+    `suffix` below them, in sorted order.
+    '''
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(suffix):
+                    yield os.path.join(root, name)
+
+
+def iter_delimited(stream, delimiter):
+    '''Yields the non-blank programs of a stream separated by `delimiter`.
+    '''
+    if delimiter == '\n':
+        for line in stream:
+            if line.strip():
+                yield line.rstrip('\n')
+        return
+
+    pending = ''
+    for chunk in iter(lambda: stream.read(READ_SIZE), ''):
+        texts = (pending + chunk).split(delimiter)
+        pending = texts.pop()
+        for text in texts:
+            if text.strip():
+                yield text
+    if pending.strip():
+        yield pending
+
+
+def iter_sources(args):
+    '''Yields `(path, text, error)` for each program to run; the path is
+    None for programs read from stdin and the text None if a file could not
+    be read.
+    '''
+    if not args.paths or args.paths == ['-']:
+        for text in iter_delimited(sys.stdin, '\0' if args.null else '\n'):
+            yield None, text, None
+        return
+
+    for path in iter_paths(args.paths, args.suffix):
+        try:
+            with open(path, encoding='utf-8') as fp:
+                yield path, fp.read(), None
+        except (IOError, UnicodeDecodeError) as ex:
+            yield path, None, {'type': type(ex).__name__, 'message': str(ex)}
+
+
+def run_batch_command(args):
+    from .parallel import encode_result, evaluate
+
+    started = time.perf_counter()
+    programs, errors, lines = 0, 0, []
+    for index, (path, text, error) in enumerate(iter_sources(args)):
+        result = {'index': index}
+        if path is not None:
+            result['path'] = path
+
+        program_started = time.perf_counter()
+        scope = None
+        if error is None:
+            scope, error = evaluate(text, args.engine)
+        result['scope'], result['error'] = scope, error
+        result['elapsed'] = time.perf_counter() - program_started
+
+        line, error = encode_result(result)
+        programs += 1
+        errors += error is not None
+        lines.append(line)
+        if len(lines) == OUTPUT_LINES:
+            sys.stdout.write('\n'.join(lines) + '\n')
+            lines = []
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+    sys.stdout.flush()
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - started
+        sys.stderr.write(
+            '{} programs, {} errors in {:.3f}s ({:.0f} programs/s)\n'.format(
+                programs, errors, elapsed, programs / elapsed if elapsed else 0
+            )
+        )
+    return 1 if errors else 0
+
+
+def run_serve_command(args):
+    from .server import serve
+
+    budget = None
+    if args.max_steps or args.timeout or args.max_bits:
+        from .budget import Budget
+        budget = Budget(args.max_steps, args.timeout, args.max_bits)
+
+    def ready(address):
+        sys.stderr.write('listening on {}\n'.format(
+            address if args.socket else '{}:{}'.format(*address[:2])
+        ))
+        sys.stderr.flush()
+
+    serve(args.socket, args.host, args.port, args.workers, args.max_pending,
+          args.engine, budget, ready)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='tinypascal', description='A Pascal interpreter'
+    )
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    batch = commands.add_parser(
+        'batch', help='run many programs in this process, as JSON Lines'
+    )
+    batch.add_argument('paths', nargs='*',
+                       help='program files or directories of them; '
+                            'programs are read from stdin, one per line, '
+                            'when none are given or with -')
+    batch.add_argument('-0', '--null', action='store_true',
+                       help='programs on stdin are separated by NUL '
+                            'characters instead of newlines')
+    batch.add_argument('--suffix', default='.pas',
+                       help='suffix of the program files in directories')
+    batch.add_argument('--engine', choices=sorted(ENGINES), default='tree')
+    batch.add_argument('-q', '--quiet', action='store_true',
+                       help="don't report totals")
+    batch.set_defaults(handler=run_batch_command)
+
+    parallel = commands.add_parser(
+        'parallel', help='run many programs across a pool of processes'
+    )
+    parallel.add_argument('paths', nargs='+', help='program files')
+    parallel.add_argument('-j', '--workers', type=int,
+                          help='number of worker processes')
+    parallel.add_argument('--engine', choices=sorted(ENGINES),
+                          default='tree')
+    parallel.add_argument('--chunksize', type=int, default=64,
+                          help='programs sent to a worker at a time')
+    parallel.add_argument('-q', '--quiet', action='store_true',
+                          help="don't report progress")
+    parallel.set_defaults(handler=run_parallel_command)
+
+    profile = commands.add_parser(
+        'profile', help='run a program and report where its time goes'
+    )
+    profile.add_argument('path', help='program file')
+    profile.add_argument('--engine', choices=sorted(ENGINES), default='tree')
+    profile.add_argument('-o', '--output',
+                         help='file to write the JSON statistics to')
+    profile.add_argument('--collapsed',
+                         help='file to write collapsed call stacks to, '
+                              'for flamegraph tools')
+    profile.add_argument('--variables', type=int, default=10,
+                         help='number of hottest variables to report')
+    profile.set_defaults(handler=run_profile_command)
+
+    serve = commands.add_parser(
+        'serve', help='evaluate programs sent over a socket'
+    )
+    serve.add_argument('--socket', help='Unix socket to listen on')
+    serve.add_argument('--host', default='127.0.0.1',
+                       help='address to listen on without --socket')
+    serve.add_argument('--port', type=int, default=7272)
+    serve.add_argument('-j', '--workers', type=int,
+                       help='number of worker processes')
+    serve.add_argument('--max-pending', type=int,
+                       help='requests accepted before pushing back on '
+                            'clients (default: 4 per worker)')
+    serve.add_argument('--engine', choices=sorted(ENGINES), default='tree')
+    serve.add_argument('--max-steps', type=int,
+                       help='steps a run may take before being stopped')
+    serve.add_argument('--timeout', type=float,
+                       help='seconds a run may take before being stopped')
+    serve.add_argument('--max-bits', type=int,
+                       help='bits an integer computed by a run may have')
+    serve.set_defaults(handler=run_serve_command)
+    return parser
+
+
+def run_command(argv):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,92 @@
+'''Blocking client of the evaluation server in `tinypascal.server`.
+
+    with Client(path='/tmp/tinypascal.sock') as client:
+        client.evaluate('BEGIN b := a * 2 END.', {'a': 21})['scope']
+'''
+import json
+import socket
+
+
+class Client:
+    '''A connection to an evaluation server, over the Unix socket `path` or
+    else TCP to `host` and `port`.
+    '''
+    def __init__(self, path=None, host='127.0.0.1', port=None, timeout=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = path
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (host, port)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.file = self.socket.makefile('rwb')
+        self.next_id = 0
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def send(self, request):
+        '''Sends a request and returns its id, numbering it if needed.
+        '''
+        if 'id' not in request:
+            request = dict(request, id=self.next_id)
+            self.next_id += 1
+        self.file.write(json.dumps(request).encode('utf-8') + b'\n')
+        return request['id']
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('Connection closed by the server')
+        return json.loads(line.decode('utf-8'))
+
+    def request(self, request):
+        self.send(request)
+        self.file.flush()
+        return self.receive()
+
+    def evaluate(self, program, scope=None, engine=None):
+        '''Runs `program` on the server and returns its response, a dict
+        with the final `scope`, the `error` if it failed and the `elapsed`
+        seconds the server took.
+        '''
+        request = {'program': program}
+        if scope is not None:
+            request['scope'] = scope
+        if engine is not None:
+            request['engine'] = engine
+        return self.request(request)
+
+    def evaluate_many(self, programs, engine=None, window=64):
+        '''Runs each `(program, scope)` pair of `programs`, keeping up to
+        `window` requests in flight, and returns the responses in the order
+        of `programs`.
+        '''
+        responses, ids = {}, []
+        for program, scope in programs:
+            request = {'program': program, 'scope': scope}
+            if engine is not None:
+                request['engine'] = engine
+            ids.append(self.send(request))
+            if len(ids) - len(responses) >= window:
+                self.file.flush()
+                response = self.receive()
+                responses[response['id']] = response
+        self.file.flush()
+        while len(responses) < len(ids):
+            response = self.receive()
+            responses[response['id']] = response
+        return [responses[key] for key in ids]
+
+    def stats(self):
+        '''Returns the statistics of the server, see `ServerStats`.
+        '''
+        return self.request({'stats': True})['stats']
@@ -0,0 +1,148 @@
+'''Closure compiler; turns a program into a native Python function.
+
+The AST is translated once into Python source which is `compile()`d and
+executed to create a closure over the program's constants. Running the
+program afterwards is a single call of that function, leaving only plain
+CPython arithmetic and dict accesses on `scope`.
+
+Unbound variables surface from the generated code as a `KeyError` which is
+turned back into the `NameError` the tree walker raises. Pre-seeded scopes
+must therefore not bind names to `None`, which the tree walker treats as
+unbound.
+'''
+from .interpreter import NodeVisitor
+from .lexer import TokenType
+from .parser import BinOp, UnaryOp
+
+
+# Binding strength of the generated Python expressions; higher binds tighter.
+SUM, PRODUCT, UNARY, ATOM = range(4)
+
+BINARY_OPERATORS = {
+    TokenType.PLUS: ('+', SUM),
+    TokenType.MINUS: ('-', SUM),
+    TokenType.MUL: ('*', PRODUCT),
+    TokenType.DIV: ('/', PRODUCT),
+}
+
+UNARY_OPERATORS = {
+    TokenType.PLUS: '+',
+    TokenType.MINUS: '-',
+}
+
+# Expressions nested deeper than this are emitted one operation per line so
+# the generated source stays within the limits of Python's own compiler.
+MAX_INLINE_DEPTH = 64
+
+# Integer constants beyond this magnitude are passed in as closure cells
+# instead of being written out as literals.
+MAX_LITERAL = 10 ** 15
+
+
+class ClosureProgram:
+    '''A program compiled into the Python function `function`.
+    '''
+    def __init__(self, source, function):
+        self.source = source
+        self.function = function
+
+    def execute(self, scope):
+        return self.function(scope)
+
+
+class ClosureCompiler(NodeVisitor):
+    '''Generates the Python source of a function running the program.
+
+    Expressions are visited into `(source, binding, depth)` triples, so
+    parentheses are only written where Python's operator precedence would
+    otherwise group the operands differently.
+    '''
+    def __init__(self):
+        self.lines = []
+        self.constants = []
+
+    def constant(self, value):
+        if type(value) is int and 0 <= value < MAX_LITERAL:
+            return repr(value), ATOM
+        name = '_k{}'.format(len(self.constants))
+        self.constants.append(value)
+        return name, ATOM
+
+    def operand(self, node, binding):
+        source, node_binding, depth = self.visit(node)
+        if node_binding < binding:
+            source = '(' + source + ')'
+        return source, depth
+
+    def visit_Assign(self, node):
+        target = 'scope[{!r}]'.format(node.left.value)
+        source, _, depth = self.visit(node.right)
+        if depth > MAX_INLINE_DEPTH:
+            source = self.emit_registers(node.right, 0)
+        self.lines.append('{} = {}'.format(target, source))
+
+    def visit_BinOp(self, node):
+        operator, binding = BINARY_OPERATORS[node.op.type]
+        left, left_depth = self.operand(node.left, binding)
+        right, right_depth = self.operand(node.right, binding + 1)
+        source = '{} {} {}'.format(left, operator, right)
+        return source, binding, max(left_depth, right_depth) + 1
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_UnaryOp(self, node):
+        operand, depth = self.operand(node.expr, UNARY)
+        return UNARY_OPERATORS[node.op.type] + operand, UNARY, depth + 1
+
+    def visit_Num(self, node):
+        source, binding = self.constant(node.value)
+        return source, binding, 0
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Var(self, node):
+        return 'scope[{!r}]'.format(node.value), ATOM, 0
+
+    def emit_registers(self, node, register):
+        '''Emits `node` as one operation per line into local variables
+        `_r<register>` and upwards, returning the name holding its value.
+        '''
+        target = '_r{}'.format(register)
+        if isinstance(node, BinOp):
+            operator, _ = BINARY_OPERATORS[node.op.type]
+            left = self.emit_registers(node.left, register)
+            right = self.emit_registers(node.right, register + 1)
+            source = '{} {} {}'.format(left, operator, right)
+        elif isinstance(node, UnaryOp):
+            operand = self.emit_registers(node.expr, register)
+            source = UNARY_OPERATORS[node.op.type] + operand
+        else:
+            source, _, _ = self.visit(node)
+        self.lines.append('{} = {}'.format(target, source))
+        return target
+
+    def compile(self, tree):
+        self.visit(tree)
+        body = '\n'.join('            ' + line for line in self.lines)
+        source = '\n'.join([
+            'def make_program({}):'.format(', '.join(
+                '_k{}'.format(i) for i in range(len(self.constants))
+            )),
+            '    def program(scope):',
+            '        try:',
+            body or '            pass',
+            '        except KeyError as ex:',
+            '            raise NameError(repr(ex.args[0])) from None',
+            '    return program',
+        ])
+        namespace = {}
+        exec(compile(source, '<tinypascal>', 'exec'), namespace)
+        function = namespace['make_program'](*self.constants)
+        return ClosureProgram(source, function)
+
+
+def compile_program(tree):
+    return ClosureCompiler().compile(tree)
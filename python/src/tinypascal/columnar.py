@@ -0,0 +1,209 @@
+'''Columnar evaluation of a program over whole tables of inputs.
+
+Each variable holds a NumPy array with one value per row and every `Assign`
+is executed as a few array operations over all rows at once. Results are
+the ones running the program row by row with `Interpreter` gives:
+
+- int columns are computed as int64 while no value can leave its range,
+  otherwise as object arrays of Python ints, so nothing ever wraps around;
+- `DIV` produces floats, computed in float64 only while both operands are
+  within 2**53 and are therefore converted exactly;
+- a zero divisor in any row raises `ZeroDivisionError` and an unbound
+  variable raises `NameError`, for the whole table.
+
+NumPy is an optional dependency, install it with `tinypascal[numpy]`.
+'''
+import operator
+
+from .interpreter import NodeVisitor
+from .lexer import TokenType
+
+
+INT64_MAX = 2 ** 63 - 1
+EXACT_FLOAT_MAX = 2 ** 53
+
+OPERATIONS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.MUL: operator.mul,
+}
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            'Columnar evaluation requires NumPy; install tinypascal[numpy]'
+        )
+    return numpy
+
+
+class ColumnarEvaluator(NodeVisitor):
+    '''Evaluates a program with each variable bound to a column of values.
+
+    Values are either NumPy arrays, one entry per row, or plain Python
+    numbers for sub-expressions made only of constants.
+    '''
+    def __init__(self, columns, rows=None):
+        self.np = np = import_numpy()
+        self.scope = {}
+        for name, column in columns.items():
+            self.scope[name] = self.as_column(np.asarray(column))
+
+        lengths = set(len(column) for column in self.scope.values())
+        if rows is not None:
+            lengths.add(rows)
+        if len(lengths) > 1:
+            raise ValueError('Columns differ in length: {}'.format(
+                sorted(lengths)
+            ))
+        self.rows = lengths.pop() if lengths else 1
+
+    def as_column(self, array):
+        np = self.np
+        if array.dtype.kind in 'bi' or (
+                array.dtype.kind == 'u' and array.dtype.itemsize < 8):
+            return array.astype(np.int64)
+        if array.dtype.kind == 'f':
+            return array.astype(np.float64)
+        return array.astype(object)
+
+    def magnitude(self, value):
+        '''Returns the largest absolute value of an int operand as a Python
+        int, or None when the operand is not int-typed.
+        '''
+        if isinstance(value, self.np.ndarray):
+            if value.dtype != self.np.int64:
+                return None
+            if not len(value):
+                return 0
+            return max(int(value.max()), -int(value.min()))
+        if type(value) is int:
+            return abs(value)
+        return None
+
+    def as_objects(self, value):
+        if isinstance(value, self.np.ndarray):
+            return value.astype(object)
+        return value
+
+    def arithmetic(self, op, left, right):
+        np = self.np
+        if not isinstance(left, np.ndarray) and \
+                not isinstance(right, np.ndarray):
+            return OPERATIONS[op](left, right)
+
+        left_max, right_max = self.magnitude(left), self.magnitude(right)
+        if left_max is not None and right_max is not None:
+            if op == TokenType.MUL:
+                exact = left_max * right_max <= INT64_MAX
+            else:
+                exact = left_max + right_max <= INT64_MAX
+        else:
+            exact = all(
+                not isinstance(value, np.ndarray) or value.dtype != object
+                for value in (left, right)
+            ) and all(
+                magnitude is None or magnitude <= INT64_MAX
+                for magnitude in (left_max, right_max)
+            )
+
+        if not exact:
+            left, right = self.as_objects(left), self.as_objects(right)
+        with np.errstate(over='ignore', invalid='ignore'):
+            return OPERATIONS[op](left, right)
+
+    def divide(self, left, right):
+        np = self.np
+        if not isinstance(left, np.ndarray) and \
+                not isinstance(right, np.ndarray):
+            return left / right
+        if np.any(np.asarray(right) == 0):
+            raise ZeroDivisionError('division by zero')
+
+        exact = True
+        for value in (left, right):
+            magnitude = self.magnitude(value)
+            if magnitude is not None and magnitude > EXACT_FLOAT_MAX:
+                exact = False
+            elif isinstance(value, np.ndarray) and value.dtype == object:
+                exact = False
+        if exact:
+            with np.errstate(over='ignore', invalid='ignore'):
+                return np.true_divide(left, right, dtype=np.float64)
+
+        with np.errstate(over='ignore', invalid='ignore'):
+            result = self.as_objects(left) / self.as_objects(right)
+        return np.asarray(result, dtype=np.float64)
+
+    def visit_Assign(self, node):
+        self.scope[node.left.value] = self.visit(node.right)
+
+    def visit_BinOp(self, node):
+        left, right = self.visit(node.left), self.visit(node.right)
+        if node.op.type == TokenType.DIV:
+            return self.divide(left, right)
+        return self.arithmetic(node.op.type, left, right)
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_UnaryOp(self, node):
+        value = self.visit(node.expr)
+        if node.op.type == TokenType.PLUS:
+            return + value
+        if self.magnitude(value) is not None and \
+                isinstance(value, self.np.ndarray) and \
+                len(value) and int(value.min()) == - INT64_MAX - 1:
+            value = value.astype(object)
+        return - value
+
+    def visit_Num(self, node):
+        return node.value
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Var(self, node):
+        var_name = node.value
+        val = self.scope.get(var_name)
+        if val is None:
+            raise NameError(repr(var_name))
+        return val
+
+    def column(self, value):
+        '''Broadcasts a constant result into a column of `rows` values.
+        '''
+        np = self.np
+        if isinstance(value, np.ndarray):
+            return value
+        if type(value) is int and abs(value) <= INT64_MAX:
+            return np.full(self.rows, value, dtype=np.int64)
+        if type(value) is int:
+            column = np.empty(self.rows, dtype=object)
+            column.fill(value)
+            return column
+        return np.full(self.rows, value, dtype=np.float64)
+
+    def evaluate(self, tree):
+        self.visit(tree)
+        return {name: self.column(value) for name, value in self.scope.items()}
+
+
+class ColumnarProgram:
+    '''A parsed program evaluated over columns of inputs.
+    '''
+    def __init__(self, tree):
+        self.tree = tree
+
+    def execute(self, columns, rows=None):
+        '''Runs the program with each variable of `columns` bound to an array
+        of input values, returning a dict of the final arrays.
+        '''
+        return ColumnarEvaluator(columns, rows).evaluate(self.tree)
+
+
+def evaluate_columns(tree, columns, rows=None):
+    return ColumnarProgram(tree).execute(columns, rows)
@@ -0,0 +1,191 @@
+'''Read/write dependency analysis of the assignments in a program.
+
+The `Assign` statements of a `Compound`, nested compounds included, form a
+dependency graph: a statement depends on the earlier statements whose target
+it reads (read after write), whose target it assigns again (write after
+write) and which read the variable it assigns (write after read).
+Statements on the same level of that graph are independent of each other
+and `ScheduledProgram` evaluates them as one group.
+
+Big-integer arithmetic holds the GIL, so the statements of a level are only
+run concurrently on a pool of processes, given with `max_workers`:
+
+    program = compile_program(tree, 'dataflow', max_workers=4)
+
+Sending a statement to a worker means pickling the values it reads and the
+one it computes, which only pays off for heavy arithmetic; statements
+reading less than `HEAVY_BITS` bits of integers are evaluated in process.
+'''
+import concurrent.futures
+
+from .interpreter import Interpreter
+from .parser import Assign, Var, walk
+
+
+# Bits of the integers a statement reads from which it is worth evaluating
+# in a worker process.
+HEAVY_BITS = 2 ** 16
+
+
+def flatten(node):
+    '''Returns the `Assign` statements of `node` in execution order.
+    '''
+    return [child for child in walk(node) if isinstance(child, Assign)]
+
+
+def names_read(node):
+    '''Returns the names of the variables `node` reads.
+    '''
+    return {child.value for child in walk(node) if isinstance(child, Var)}
+
+
+class DependencyGraph:
+    '''Dependencies between a sequence of `Assign` statements.
+
+    `reads[i]` and `writes[i]` are the variables read and assigned by
+    statement `i`, `depends[i]` the indexes of the statements it must run
+    after and `level[i]` the length of its longest chain of dependencies.
+    '''
+    def __init__(self, statements):
+        self.statements = statements
+        self.reads = [names_read(node.right) for node in statements]
+        self.writes = [{node.left.value} for node in statements]
+        self.depends = []
+        self.level = []
+
+        last_writer, readers = {}, {}
+        for index, reads in enumerate(self.reads):
+            depends = set()
+            for name in reads:
+                if name in last_writer:
+                    depends.add(last_writer[name])
+            for name in self.writes[index]:
+                if name in last_writer:
+                    depends.add(last_writer[name])
+                depends.update(readers.pop(name, ()))
+            for name in reads:
+                readers.setdefault(name, []).append(index)
+            for name in self.writes[index]:
+                last_writer[name] = index
+
+            self.depends.append(depends)
+            self.level.append(
+                max((self.level[i] for i in depends), default=-1) + 1
+            )
+
+    @classmethod
+    def from_tree(cls, tree):
+        return cls(flatten(tree))
+
+    def levels(self):
+        '''Groups the statement indexes by level, each in program order.
+        '''
+        groups = [[] for _ in range(max(self.level, default=-1) + 1)]
+        for index, level in enumerate(self.level):
+            groups[level].append(index)
+        return groups
+
+
+def evaluate_expression(node, bindings):
+    '''Evaluates the expression `node` against `bindings`, returning its
+    value and None, or None and the exception it raised.
+    '''
+    evaluator = Interpreter(None)
+    evaluator.GLOBAL_SCOPE = bindings
+    try:
+        return evaluator.visit(node), None
+    except Exception as ex:
+        return None, ex
+
+
+class ScheduledProgram:
+    '''Evaluates a program level by level of its `DependencyGraph`.
+
+    The right-hand sides of a level's statements are evaluated together
+    against a working copy of the scope, the heavy ones on the pool of
+    `max_workers` processes when a level has several. The pool is started
+    on first use and kept until `close`. Expressions have no side effects,
+    so the assignments are then applied to the real scope in program order;
+    should a statement fail, only the statements before it are applied,
+    exactly as when running the program sequentially.
+    '''
+    def __init__(self, tree, max_workers=None):
+        self.graph = DependencyGraph.from_tree(tree)
+        self.schedule = self.graph.levels()
+        self.max_workers = max_workers
+        self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def heavy(self, level, env):
+        '''Returns the statements of `level` worth evaluating in a worker
+        process, none unless there are at least two of them.
+        '''
+        if self.max_workers is None:
+            return []
+        heavy = []
+        for index in level:
+            bits = 0
+            for name in self.graph.reads[index]:
+                value = env.get(name)
+                if type(value) is int:
+                    bits += value.bit_length()
+            if bits >= HEAVY_BITS:
+                heavy.append(index)
+        return heavy if len(heavy) > 1 else []
+
+    def submit(self, index, env):
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                self.max_workers
+            )
+        bindings = {name: env[name] for name in self.graph.reads[index]
+                    if name in env}
+        return self.pool.submit(
+            evaluate_expression, self.graph.statements[index].right, bindings
+        )
+
+    def execute(self, scope):
+        statements = self.graph.statements
+        env = dict(scope)
+
+        values, failed, error = [None] * len(statements), len(statements), None
+        for level in self.schedule:
+            level = [index for index in level if index < failed]
+            futures = {index: self.submit(index, env)
+                       for index in self.heavy(level, env)}
+            results = {}
+            for index in level:
+                if index not in futures:
+                    results[index] = evaluate_expression(
+                        statements[index].right, env
+                    )
+            for index, future in futures.items():
+                results[index] = future.result()
+
+            for index in level:
+                value, ex = results[index]
+                if ex is not None:
+                    if index < failed:
+                        failed, error = index, ex
+                    continue
+                values[index] = value
+                env[statements[index].left.value] = value
+
+        for index in range(failed):
+            scope[statements[index].left.value] = values[index]
+        if error is not None:
+            raise error
+
+
+def compile_program(tree, max_workers=None):
+    return ScheduledProgram(tree, max_workers)
@@ -0,0 +1,462 @@
+'''Incremental re-parsing and re-execution of a program after text edits.
+
+`IncrementalProgram` keeps the source of a program together with its
+top-level statements, the span of source text each one was parsed from and
+the values each one read and assigned when it last ran. An edit then only
+re-lexes and re-parses the statements around it, and only re-executes
+statements whose inputs changed, following the reads and writes of each
+statement through the rest of the program.
+
+Any failure along the incremental path, such as an edit that changes the
+program's overall structure, falls back to parsing or running the whole
+program, which raises the same errors `Parser` and `Interpreter` would;
+after a syntax error `scope` keeps the values of the last successful run.
+The final `scope` equals the one of a complete run, although the order of
+its keys may differ.
+
+Besides that work, an edit costs bookkeeping logarithmic in the size of
+the program, plus some proportional to the number of statements between it
+and the previous edit:
+
+- each statement keeps its own source text and the separator following it,
+  which `text` joins only when it is read;
+- the spans of the statements after the previous edit are kept as offsets
+  from the end of the source, like the text after the gap of a gap buffer,
+  so an edit doesn't shift them;
+- each statement has an order `key`, and the keys of the statements
+  reading and assigning each variable are kept sorted, so the last value
+  assigned to a variable before a statement and the next statements
+  reading it are found by bisection.
+'''
+import bisect
+import heapq
+
+from .dataflow import names_read
+from .interpreter import Interpreter
+from .lexer import Lexer, TokenType
+from .parser import Assign, Parser, walk
+
+
+UNBOUND = object()
+
+# Distance between the keys of consecutive statements when they are
+# numbered afresh; statements inserted later take keys in between.
+KEY_SPACING = 2 ** 64
+
+
+def same(left, right):
+    return type(left) is type(right) and left == right
+
+
+def joins(text, index):
+    '''Whether the characters either side of `index` would lex as one token.
+    '''
+    return 0 < index < len(text) and text[index - 1].isalnum() \
+        and text[index].isalnum()
+
+
+class Statement:
+    '''A top-level statement, parsed from `text[start:end]`.
+
+    `source` is that text and `separator` the text up to the next
+    statement, or to the end of the program for the last one. `inputs` and
+    `outputs` hold the values of the variables it read and assigned the
+    last time it ran, and `key` orders it among the program's statements.
+    '''
+    __slots__ = ('node', 'start', 'end', 'source', 'separator', 'reads',
+                 'writes', 'inputs', 'outputs', 'key')
+
+    def __init__(self, node, start, end):
+        self.node = node
+        self.start = start
+        self.end = end
+        self.source = self.separator = ''
+        self.reads = names_read(node)
+        self.writes = {child.left.value for child in walk(node)
+                       if isinstance(child, Assign)}
+        self.inputs = self.outputs = None
+        self.key = None
+
+
+def parse_statement_list(parser, base=0):
+    '''Parses `statement (SEMI statement)*` into `Statement`s whose spans
+    are offset by `base`.
+    '''
+    lexer, statements = parser.lexer, []
+    while True:
+        # the parser always holds one token; the one the lexer returned last
+        start = lexer.token_start
+        node = parser.statement()
+        statements.append(Statement(node, base + start,
+                                    base + lexer.token_start))
+        if parser.current_token.type != TokenType.SEMI:
+            break
+        parser.eat(TokenType.SEMI)
+
+    if parser.current_token.type == TokenType.ID:
+        parser.error()
+    return statements
+
+
+def split_source(statements, text, base):
+    '''Sets the `source` and `separator` of `statements`, parsed from
+    `text` with their spans offset by `base`. The last one's separator is
+    the rest of `text`.
+    '''
+    for statement, following in zip(statements, statements[1:]):
+        statement.source = text[statement.start - base:statement.end - base]
+        statement.separator = text[statement.end - base:
+                                   following.start - base]
+    last = statements[-1]
+    last.source = text[last.start - base:last.end - base]
+    last.separator = text[last.end - base:]
+
+
+class Offsets:
+    '''The `start` or `end` offsets of the statements of a program, as a
+    sequence for `bisect`.
+    '''
+    def __init__(self, program, end):
+        self.program = program
+        self.end = end
+
+    def __len__(self):
+        return len(self.program.statements)
+
+    def __getitem__(self, index):
+        return self.program.span(index)[self.end]
+
+
+class EditStats:
+    '''What an edit cost: statements re-parsed and re-executed, and whether
+    the whole program had to be parsed or run again.
+    '''
+    def __init__(self):
+        self.parsed = 0
+        self.executed = 0
+        self.full_parse = False
+        self.full_run = False
+
+    def __repr__(self):
+        return ('EditStats(parsed={}, executed={}, full_parse={}, '
+                'full_run={})').format(
+                    self.parsed, self.executed, self.full_parse,
+                    self.full_run)
+
+
+class IncrementalProgram:
+    '''A program kept parsed and executed across edits of its source.
+
+    The source is `prefix` followed by the `source` and `separator` of
+    each statement. The spans of `statements[:gap]` are offsets into it,
+    those of the later statements offsets from its end, `size`; use `span`
+    to read them.
+    '''
+    def __init__(self, text, scope=None):
+        self.initial = dict(scope or {})
+        self.interpreter = Interpreter(None)
+        self._text = text
+        self.size = len(text)
+        self.prefix = ''
+        self.statements = None
+        self.gap = 0
+        # keys of the statements reading and assigning each variable
+        self.readers = {}
+        self.writers = {}
+        self.by_key = {}
+        self.scope = None
+        self.error = None
+        self.stats = EditStats()
+        self.parse()
+        self.run()
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.prefix + ''.join(
+                statement.source + statement.separator
+                for statement in self.statements
+            )
+        return self._text
+
+    def parse(self):
+        self.statements = None
+        self.stats.full_parse = True
+        text = self.text
+        parser = Parser(Lexer(text))
+        parser.eat(TokenType.BEGIN)
+        statements = parse_statement_list(parser)
+        parser.eat(TokenType.END)
+        parser.eat(TokenType.DOT)
+        if parser.current_token.type != TokenType.EOF:
+            parser.error()
+        split_source(statements, text, 0)
+        self.prefix = text[:statements[0].start]
+        self.statements = statements
+        self.size = len(text)
+        self.gap = len(statements)
+        self.renumber()
+        self.stats.parsed += len(statements)
+
+    def span(self, index):
+        '''Returns the start and end offsets of `statements[index]`.
+        '''
+        statement = self.statements[index]
+        if index < self.gap:
+            return statement.start, statement.end
+        return self.size - statement.start, self.size - statement.end
+
+    def move_gap(self, index):
+        '''Makes `index` the first statement whose span is kept relative to
+        the end of the text, converting the spans in between.
+        '''
+        statements, size = self.statements, self.size
+        for statement in statements[index:self.gap]:
+            statement.start = size - statement.start
+            statement.end = size - statement.end
+        for statement in statements[self.gap:index]:
+            statement.start = size - statement.start
+            statement.end = size - statement.end
+        self.gap = index
+
+    def index(self, statement):
+        self.by_key[statement.key] = statement
+        for name in statement.reads:
+            bisect.insort(self.readers.setdefault(name, []), statement.key)
+        for name in statement.writes:
+            bisect.insort(self.writers.setdefault(name, []), statement.key)
+
+    def unindex(self, statement):
+        del self.by_key[statement.key]
+        for names, index in [(statement.reads, self.readers),
+                             (statement.writes, self.writers)]:
+            for name in names:
+                keys = index[name]
+                del keys[bisect.bisect_left(keys, statement.key)]
+
+    def renumber(self):
+        '''Gives every statement a new key and rebuilds the variable
+        indexes.
+        '''
+        self.readers, self.writers, self.by_key = {}, {}, {}
+        for position, statement in enumerate(self.statements):
+            statement.key = position * KEY_SPACING
+            self.index(statement)
+
+    def number(self, lo, count):
+        '''Keys and indexes the `count` statements inserted at `lo`.
+        '''
+        statements = self.statements
+        hi = lo + count
+        if lo == 0 and hi == len(statements):
+            return self.renumber()
+        if lo == 0:
+            step = KEY_SPACING
+            first = statements[hi].key - count * step
+        elif hi == len(statements):
+            step = KEY_SPACING
+            first = statements[lo - 1].key + step
+        else:
+            step = (statements[hi].key - statements[lo - 1].key) // (count + 1)
+            first = statements[lo - 1].key + step
+            if not step:
+                # inserts at the same place used up the keys in between
+                return self.renumber()
+        for position, statement in enumerate(statements[lo:hi]):
+            statement.key = first + position * step
+            self.index(statement)
+
+    def run(self):
+        '''Executes every statement, recording what each one read and wrote.
+        '''
+        self.stats.full_run = True
+        self.error = None
+        self.scope = scope = dict(self.initial)
+        self.interpreter.GLOBAL_SCOPE = scope
+        for statement in self.statements:
+            statement.inputs = {name: scope[name] for name in statement.reads
+                                if scope.get(name) is not None}
+            statement.outputs = None
+            try:
+                self.interpreter.visit(statement.node)
+            except Exception as ex:
+                self.error = ex
+                raise
+            finally:
+                self.stats.executed += 1
+            statement.outputs = {name: scope[name]
+                                 for name in statement.writes}
+
+    def edit(self, start, end, text):
+        '''Replaces `self.text[start:end]` with `text` and brings the parsed
+        statements and `scope` up to date. Returns the `EditStats` of it.
+        '''
+        self.stats = stats = EditStats()
+        region = None
+        if self.statements is not None:
+            region = self.reparse(start, end, text)
+        if region is None:
+            source = self.text
+            self._text = source[:start] + text + source[end:]
+            self.parse()
+            self.run()
+            return stats
+
+        lo, count, removed = region
+        if self.error is not None:
+            self.run()
+            return stats
+        try:
+            self.propagate(lo, count, removed)
+        except Exception:
+            self.run()
+        return stats
+
+    def reparse(self, start, end, text):
+        '''Re-parses the statements around the replacement of `[start, end)`
+        with `text` and splices them in. Returns the index of the first new
+        statement, their number and the statements they replace, or None if
+        the edit can't be handled locally.
+        '''
+        statements = self.statements
+        lo = bisect.bisect_left(Offsets(self, 1), start)
+        hi = bisect.bisect_right(Offsets(self, 0), end) - 1
+        lo, hi = min(lo, len(statements) - 1), max(hi, 0)
+        # widen the region to whole statements enclosing the edit, so it is
+        # bounded by separators the edit left untouched
+        while lo > 0 and self.span(lo)[0] > start:
+            lo -= 1
+        while hi < len(statements) - 1 and self.span(hi)[1] < end:
+            hi += 1
+        if lo > hi or self.span(lo)[0] > start or self.span(hi)[1] < end:
+            return None
+
+        base = self.span(lo)[0]
+        source = ''.join(statement.source + statement.separator
+                         for statement in statements[lo:hi])
+        source += statements[hi].source
+        source = source[:start - base] + text + source[end - base:]
+        before = statements[lo - 1].separator if lo else self.prefix
+        after = statements[hi].separator
+        around = before[-1:] + source + after[:1]
+        if joins(around, len(before[-1:])) or \
+                joins(around, len(around) - len(after[:1])):
+            return None
+        try:
+            parser = Parser(Lexer(source))
+            replacement = parse_statement_list(parser, base)
+            if parser.current_token.type != TokenType.EOF:
+                return None
+        except Exception:
+            return None
+
+        split_source(replacement, source, base)
+        replacement[-1].separator += after
+        # text the edit put before the first statement separates it from
+        # the previous one
+        leading = source[:replacement[0].start - base]
+        if lo:
+            statements[lo - 1].separator += leading
+        else:
+            self.prefix += leading
+
+        # the statements after the region keep their offsets from the end
+        self.move_gap(hi + 1)
+        self.size += len(text) - (end - start)
+        self._text = None
+        for statement in replacement:
+            statement.start = self.size - statement.start
+            statement.end = self.size - statement.end
+        removed = statements[lo:hi + 1]
+        for statement in removed:
+            self.unindex(statement)
+        statements[lo:hi + 1] = replacement
+        self.gap = lo
+        self.number(lo, len(replacement))
+        self.stats.parsed += len(replacement)
+        return lo, len(replacement), removed
+
+    def value_at(self, key, name):
+        '''Returns the value `name` holds before the statement with `key`
+        runs, or after the last one if `key` is None.
+        '''
+        writers = self.writers.get(name)
+        if writers:
+            if key is None:
+                index = len(writers)
+            else:
+                index = bisect.bisect_left(writers, key)
+            if index:
+                return self.by_key[writers[index - 1]].outputs[name]
+        value = self.initial.get(name)
+        return UNBOUND if value is None else value
+
+    def execute(self, statement):
+        scope = {}
+        for name in statement.reads:
+            value = self.value_at(statement.key, name)
+            if value is not UNBOUND:
+                scope[name] = value
+        statement.inputs = dict(scope)
+        self.interpreter.GLOBAL_SCOPE = scope
+        self.interpreter.visit(statement.node)
+        statement.outputs = {name: scope[name] for name in statement.writes}
+        self.stats.executed += 1
+
+    def readers_after(self, key, name):
+        '''Returns the keys of the statements after `key` reading the value
+        `name` holds then, up to the next one assigning it.
+        '''
+        readers = self.readers.get(name)
+        if not readers:
+            return []
+        writers = self.writers.get(name, ())
+        index = bisect.bisect_right(writers, key)
+        stop = len(readers)
+        if index < len(writers):
+            stop = bisect.bisect_right(readers, writers[index])
+        return readers[bisect.bisect_right(readers, key):stop]
+
+    def propagate(self, lo, count, removed):
+        '''Runs the statements replacing `removed`, then re-executes the
+        statements after them whose inputs changed as a result.
+        '''
+        region = self.statements[lo:lo + count]
+        for statement in region:
+            self.execute(statement)
+
+        # keys of the statements to run again, in program order
+        pending = []
+        first, last = region[0].key, region[-1].key
+        names = set().union(*(statement.writes for statement in removed))
+        names.update(*(statement.writes for statement in region))
+        for name in names:
+            previous = self.value_at(first, name)
+            for statement in removed:
+                if name in statement.writes:
+                    previous = statement.outputs[name]
+            if not same(self.value_at(last + 1, name), previous):
+                pending.extend(self.readers_after(last, name))
+        heapq.heapify(pending)
+
+        done = None
+        while pending:
+            key = heapq.heappop(pending)
+            if key == done:
+                continue
+            done = key
+            statement = self.by_key[key]
+            outputs = statement.outputs
+            self.execute(statement)
+            for name in statement.writes:
+                names.add(name)
+                if not same(statement.outputs[name], outputs[name]):
+                    for reader in self.readers_after(key, name):
+                        heapq.heappush(pending, reader)
+
+        for name in names:
+            value = self.value_at(None, name)
+            if value is UNBOUND:
+                self.scope.pop(name, None)
+            else:
+                self.scope[name] = value
@@ -0,0 +1,144 @@
+'''Static inference of the types of the values a program computes.
+
+Every value is a Python int or float: `DIV` always gives a float, `+`, `-`
+and `*` give an int only when both operands are ints and unary operators
+keep the type of their operand. Programs have no branches, so walking the
+statements in order tells the exact type each `Var` reads and each `BinOp`
+computes, given the types of the variables read before being assigned:
+
+    info = infer_types(tree, inputs={'x': INT})
+    info.variables         # {'y': 'int', 'z': 'float'}
+
+Values whose type depends on unknown inputs are `UNKNOWN`; they may be
+either. `INT` values are Python ints and so unbounded: storage specialized
+for them, such as `array('q')`, still needs a fallback for values over 64
+bits, see `allocate_column`.
+'''
+from array import array
+
+from .interpreter import NodeVisitor
+from .lexer import TokenType
+
+
+INT = 'int'
+FLOAT = 'float'
+UNKNOWN = 'unknown'
+
+# `array` type codes of the columns allocated for each type.
+TYPECODES = {
+    INT: 'q',
+    FLOAT: 'd',
+}
+
+
+def arithmetic_type(left, right):
+    '''Returns the type of `left + right`, `left - right` or `left * right`
+    for operands of types `left` and `right`.
+    '''
+    if left == INT and right == INT:
+        return INT
+    if left == FLOAT or right == FLOAT:
+        return FLOAT
+    return UNKNOWN
+
+
+class TypeInfo:
+    '''The types inferred for a program.
+
+    `nodes` maps each `Var` and `BinOp` node to the type of its value, and
+    `variables` each variable the program assigns to the type of its final
+    value, in the order they are first assigned.
+    '''
+    def __init__(self, nodes, variables):
+        self.nodes = nodes
+        self.variables = variables
+
+    def type_of(self, node):
+        return self.nodes.get(node, UNKNOWN)
+
+    @property
+    def integer_only(self):
+        '''Checks every value the program computes or reads is an int.
+        '''
+        return all(kind == INT for kind in self.nodes.values()) and \
+            all(kind == INT for kind in self.variables.values())
+
+
+class TypeInference(NodeVisitor):
+    '''Infers the type of each value of a program, visiting its statements
+    in the order they run.
+
+    `inputs` maps the variables bound before the program runs to their
+    type, the others being `UNKNOWN` until assigned.
+    '''
+    def __init__(self, inputs=None):
+        self.env = dict(inputs or {})
+        self.nodes = {}
+        self.variables = {}
+
+    def visit_Assign(self, node):
+        kind = self.visit(node.right)
+        self.env[node.left.value] = kind
+        self.variables[node.left.value] = kind
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if node.op.type == TokenType.DIV:
+            kind = FLOAT
+        else:
+            kind = arithmetic_type(left, right)
+        self.nodes[node] = kind
+        return kind
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_UnaryOp(self, node):
+        return self.visit(node.expr)
+
+    def visit_Num(self, node):
+        return INT if type(node.value) is int else FLOAT
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Var(self, node):
+        kind = self.nodes[node] = self.env.get(node.value, UNKNOWN)
+        return kind
+
+    def infer(self, tree):
+        self.visit(tree)
+        return TypeInfo(self.nodes, self.variables)
+
+
+def infer_types(tree, inputs=None):
+    '''Returns the `TypeInfo` of a parsed program, given the types of the
+    variables bound before it runs.
+    '''
+    return TypeInference(inputs).infer(tree)
+
+
+def allocate_column(kind, rows):
+    '''Returns a column of `rows` zeroes for values of type `kind`; an
+    `array('q')` for `INT`, an `array('d')` for `FLOAT` and a list for
+    `UNKNOWN`. See `store` for putting values in it.
+    '''
+    typecode = TYPECODES.get(kind)
+    if typecode is None:
+        return [0] * rows
+    return array(typecode, [0]) * rows
+
+
+def store(column, index, value):
+    '''Sets `column[index]` to `value`, returning the column to keep using:
+    an `array` column is copied into a list when `value` doesn't fit it,
+    such as an int over 64 bits.
+    '''
+    try:
+        column[index] = value
+    except (OverflowError, TypeError):
+        column = list(column)
+        column[index] = value
+    return column
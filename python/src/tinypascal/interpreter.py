@@ -0,0 +1,160 @@
+import importlib
+from .lexer import TokenType
+
+
+# Execution engines, mapped to the module that compiles a parsed program for
+# them. The 'tree' engine walks the AST directly and needs no compilation;
+# every other module provides a `compile_program(tree, **options)` function
+# whose result, like a `TreeProgram`, has an `execute(scope)` method.
+ENGINES = {
+    'tree': None,
+    'vm': '.vm',
+    'closure': '.closure',
+    'dataflow': '.dataflow',
+    'stack': '.stack',
+}
+
+
+class NodeVisitor:
+    '''Dispatches each node to the `visit_<NodeClass>` method for it.
+
+    The method is looked up once per (visitor class, node class) pair and
+    kept in the visitor class's own `_visitors` table, so visitors defined
+    as subclasses get cached dispatch without doing anything.
+    '''
+    _visitors = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._visitors = {}
+
+    def visit(self, node):
+        try:
+            visitor = self._visitors[type(node)]
+        except KeyError:
+            visitor = self._resolve_visitor(type(node))
+        return visitor(self, node)
+
+    @classmethod
+    def _resolve_visitor(cls, node_class):
+        method_name = 'visit_' + node_class.__name__
+        visitor = getattr(cls, method_name, cls.generic_visit)
+        cls._visitors[node_class] = visitor
+        return visitor
+
+    def generic_visit(self, node):
+        raise Exception('No visit_{} method'.format(type(node).__name__))
+
+
+class Interpreter(NodeVisitor):
+
+    def __init__(self, parser, engine='tree', optimize=False, budget=None):
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine: {!r}'.format(engine))
+        self.parser = parser
+        self.engine = engine
+        self.optimize = optimize
+        # `budget.Budget` each run is limited to, if any, and the
+        # `budget.Meter` of the run in progress
+        self.budget = budget
+        self.meter = None
+        # number of nodes removed by the optimizer, when enabled
+        self.nodes_removed = 0
+        self.GLOBAL_SCOPE = {}
+
+    def visit_Assign(self, node):
+        var_name = node.left.value
+        self.GLOBAL_SCOPE[var_name] = self.visit(node.right)
+
+    def visit_BinOp(self, node):
+        if node.op.type == TokenType.PLUS:
+            return self.visit(node.left) + self.visit(node.right)
+        if node.op.type == TokenType.MINUS:
+            return self.visit(node.left) - self.visit(node.right)
+        if node.op.type == TokenType.MUL:
+            return self.visit(node.left) * self.visit(node.right)
+        if node.op.type == TokenType.DIV:
+            return self.visit(node.left) / self.visit(node.right)
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_UnaryOp(self, node):
+        if node.op.type == TokenType.PLUS:
+            return + self.visit(node.expr)
+        if node.op.type == TokenType.MINUS:
+            return - self.visit(node.expr)
+
+    def visit_Num(self, node):
+        return node.value
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Var(self, node):
+        var_name = node.value
+        val = self.GLOBAL_SCOPE.get(var_name)
+        if val is None:
+            raise NameError(repr(var_name))
+        return val
+
+    def execute(self, tree):
+        '''Evaluates an already parsed program using the selected engine.
+        '''
+        if self.optimize:
+            from .optimizer import fold_constants
+            tree, removed = fold_constants(tree)
+            self.nodes_removed += removed
+        if self.budget is not None:
+            from .budget import run_budgeted
+            meter = self.meter or self.budget.start()
+            return run_budgeted(tree, meter, self.GLOBAL_SCOPE, self.engine)
+        if self.engine == 'tree':
+            return self.visit(tree)
+        program = compile_program(tree, self.engine)
+        return program.execute(self.GLOBAL_SCOPE)
+
+    def run(self):
+        tree = self.parser.parse()
+        return self.execute(tree)
+
+    def run_stream(self):
+        '''Executes each top-level statement as soon as it has been parsed,
+        so only one statement's subtree is held in memory at a time.
+
+        Unlike `run`, statements preceding a syntax error will already have
+        been executed when the error is raised. A budget limits the whole
+        stream, not each statement.
+        '''
+        if self.budget is not None:
+            self.meter = self.budget.start()
+        try:
+            for node in self.parser.iter_statements():
+                self.execute(node)
+        finally:
+            self.meter = None
+
+
+class TreeProgram:
+    '''A parsed program run by walking its tree with an `Interpreter`.
+    '''
+    def __init__(self, tree):
+        self.tree = tree
+        self.interpreter = Interpreter(None)
+
+    def execute(self, scope):
+        self.interpreter.GLOBAL_SCOPE = scope
+        return self.interpreter.visit(self.tree)
+
+
+def compile_program(tree, engine, **options):
+    '''Prepares a parsed program for running on one of the `ENGINES`, given
+    the engine's own `options`, such as the `max_workers` of 'dataflow'.
+    '''
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine: {!r}'.format(engine))
+    if ENGINES[engine] is None:
+        return TreeProgram(tree, **options)
+    module = importlib.import_module(ENGINES[engine], __package__)
+    return module.compile_program(tree, **options)
@@ -1,4 +1,10 @@
+import array
+import codecs
 import enum
+import mmap
+import os
+import re
+import sys
 
 
 class TokenType(enum.Enum):
@@ -19,6 +25,7 @@ class TokenType(enum.Enum):
 
 
 class Token:
+    __slots__ = ("type", "value")
 
     def __init__(self, type, value):
         self.type = type
@@ -46,23 +53,158 @@ RESERVED_KEYWORDS = {
 }
 
 
+# Tokens whose value never varies can be shared between all the places they
+# occur, the same way `RESERVED_KEYWORDS` tokens already are.
+PUNCTUATION = {
+    "+": Token(TokenType.PLUS, "+"),
+    "-": Token(TokenType.MINUS, "-"),
+    "*": Token(TokenType.MUL, "*"),
+    "/": Token(TokenType.DIV, "/"),
+    "(": Token(TokenType.LPAREN, "("),
+    ")": Token(TokenType.RPAREN, ")"),
+    ";": Token(TokenType.SEMI, ";"),
+    ".": Token(TokenType.DOT, "."),
+    ":=": Token(TokenType.ASSIGN, ":="),
+}
+
+
+# Master pattern used by the 'regex' scanner. It only recognises ASCII
+# tokens; an INTEGER or ID directly followed by a non-ASCII character is
+# rejected so that the character scanner, whose `isdigit`/`isalnum` rules
+# are Unicode aware, decides how that token ends.
+TOKEN_PATTERN = re.compile(r"""
+    \s*
+    (?:
+        (?P<INTEGER>[0-9]+)(?![0-9]|[^\x00-\x7f])
+      | (?P<ID>[A-Za-z][A-Za-z0-9]*)(?![A-Za-z0-9]|[^\x00-\x7f])
+      | (?P<PUNCTUATION>:=|[-+*/();.])
+      | (?P<EOF>\Z)
+    )
+""", re.VERBOSE)
+
+
+SCANNERS = ("char", "regex")
+
+# One byte code per token type, as stored by a `TokenBuffer`.
+TOKEN_TYPES = tuple(TokenType)
+TOKEN_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+# Shared token for each type code whose value never varies, None for the
+# others.
+FIXED_TOKENS = [None] * len(TOKEN_TYPES)
+for _token in list(PUNCTUATION.values()) + list(RESERVED_KEYWORDS.values()):
+    FIXED_TOKENS[TOKEN_CODES[_token.type]] = _token
+del _token
+
+# Number of characters (or bytes) read at a time from streamed sources.
+CHUNK_SIZE = 64 * 1024
+
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+def iter_chunks(source):
+    '''Returns an iterator over the text chunks of a streamed program source.
+
+    The source can be a path (any `os.PathLike`), a bytes-like buffer such as
+    an `mmap.mmap`, a file-like object with a `read` method or an iterable
+    of chunks. Bytes are decoded as UTF-8 a chunk at a time.
+    '''
+    if isinstance(source, os.PathLike):
+        return _read_path(source)
+    if isinstance(source, BUFFER_TYPES):
+        return _decode(
+            source[start:start + CHUNK_SIZE]
+            for start in range(0, len(source), CHUNK_SIZE)
+        )
+    if hasattr(source, "read"):
+        return _decode(_read_file(source))
+    return _decode(source)
+
+
+def _read_path(path):
+    with open(path, "rb") as fp:
+        yield from _decode(_read_file(fp))
+
+
+def _read_file(fp):
+    chunk = fp.read(CHUNK_SIZE)
+    while chunk:
+        yield chunk
+        chunk = fp.read(CHUNK_SIZE)
+
+
+def _decode(chunks):
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            yield chunk
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+        yield decoder.decode(chunk)
+    if decoder is not None:
+        yield decoder.decode(b"", final=True)
+
+
 class Lexer:
+    '''Breaks the program text into a stream of tokens.
+
+    The `scanner` argument selects how that is done: 'char' walks the text
+    one character at a time while 'regex' consumes a whole token per
+    match of `TOKEN_PATTERN`. Both produce the same token stream.
+
+    Besides a str, `text` can be any source `iter_chunks` accepts. It is
+    then read a chunk at a time and `text` only holds the part of the
+    program not yet consumed; tokens may span chunk boundaries.
+    '''
+
+    def __init__(self, text, scanner="char"):
+        if scanner not in SCANNERS:
+            raise ValueError("Unknown scanner: {!r}".format(scanner))
+
+        self.chunks = None
+        if not isinstance(text, str):
+            self.chunks = iter_chunks(text)
+            text = ""
 
-    def __init__(self, text):
         # client string input, e.g: "3 * 5", "9 + 2 - 3 * 5"
         self.text = text
         # self.pos is index into client string input, self.text
         self.pos = 0
-        self.current_char = text[self.pos]
+        # number of characters dropped from the front of a streamed input
+        # and offset in the whole input of the last token returned
+        self.offset = 0
+        self.token_start = 0
+        if self.chunks is not None:
+            self.fill()
+        self.current_char = self.text[self.pos] if self.text else None
+        self.scanner = scanner
+        if scanner == "regex":
+            self.get_next_token = self._match_next_token
 
     def error(self):
         raise Exception("Invalid character")
 
+    def fill(self):
+        '''Replace the consumed part of `text` with the next chunk of a
+        streamed input. Returns False once there is nothing left to read.
+        '''
+        if self.chunks is None:
+            return False
+        for chunk in self.chunks:
+            if chunk:
+                self.text = self.text[self.pos:] + chunk
+                self.offset += self.pos
+                self.pos = 0
+                return True
+        self.chunks = None
+        return False
+
     def advance(self):
         '''Advance the `pos` pointer and set the `current_char` variable.
         '''
         self.pos += 1
-        if self.pos > len(self.text) - 1:
+        if self.pos > len(self.text) - 1 and not self.fill():
             self.current_char = None
         else:
             self.current_char = self.text[self.pos]
@@ -70,7 +212,9 @@ class Lexer:
     def peek(self):
         peek_pos = self.pos + 1
         if peek_pos > len(self.text) - 1:
-            return None
+            if not self.fill():
+                return None
+            peek_pos = self.pos + 1
         return self.text[peek_pos]
 
     def skip_whitespace(self):
@@ -88,12 +232,18 @@ class Lexer:
 
     def _id(self):
         '''Handle identifiers and reserved keywords.
+
+        Identifier names are interned, so every occurrence of a variable
+        shares one string and scope lookups compare by identity.
         '''
         result = ''
         while self.current_char is not None and self.current_char.isalnum():
             result += self.current_char
             self.advance()
-        return RESERVED_KEYWORDS.get(result, Token(TokenType.ID, result))
+        token = RESERVED_KEYWORDS.get(result)
+        if token is None:
+            token = Token(TokenType.ID, sys.intern(result))
+        return token
 
     def get_next_token(self):
         '''Lexical analyser (aka scanner or tokenizer)
@@ -106,6 +256,7 @@ class Lexer:
                 self.skip_whitespace()
                 continue
 
+            self.token_start = self.offset + self.pos
             if self.current_char.isdigit():
                 return Token(TokenType.INTEGER, self.get_integer())
 
@@ -139,4 +290,141 @@ class Lexer:
                 return Token(TokenType.DOT, '.')
 
             self.error()
+        self.token_start = self.offset + self.pos
         return Token(TokenType.EOF, None)
+
+    def _match_next_token(self):
+        '''Lexical analyser backing the 'regex' scanner.
+
+        Tokens are matched in a single step by `TOKEN_PATTERN`; anything the
+        pattern can't decide on is handed over to `get_next_token` starting
+        at the current position.
+        '''
+        match = TOKEN_PATTERN.match(self.text, self.pos)
+        # with streamed input a match running up to the end of the buffer
+        # may continue in the next chunk, e.g. an ID or a ':' before '='
+        while self.chunks is not None and (
+                match is None or match.end() == len(self.text)):
+            if not self.fill():
+                break
+            match = TOKEN_PATTERN.match(self.text, self.pos)
+        if match is None:
+            return self._scan_next_token()
+
+        self.pos = match.end()
+        kind = match.lastgroup
+        self.token_start = self.offset + match.start(kind)
+        if kind == "ID":
+            result = match.group(kind)
+            token = RESERVED_KEYWORDS.get(result)
+            if token is None:
+                token = Token(TokenType.ID, sys.intern(result))
+            return token
+        if kind == "INTEGER":
+            return Token(TokenType.INTEGER, int(match.group(kind)))
+        if kind == "PUNCTUATION":
+            return PUNCTUATION[match.group(kind)]
+        return Token(TokenType.EOF, None)
+
+    def iter_tokens(self):
+        '''Yields the remaining tokens of the input, up to and including
+        EOF, together with the offset each one starts at.
+        '''
+        while True:
+            token = self.get_next_token()
+            yield token, self.token_start
+            if token.type == TokenType.EOF:
+                return
+
+    def tokenize(self):
+        '''Lexes the remaining input in one pass into a `TokenBuffer`.
+        '''
+        buffer = TokenBuffer()
+        for token, offset in self.iter_tokens():
+            buffer.append(token, offset)
+        return buffer
+
+    def _scan_next_token(self):
+        if self.pos > len(self.text) - 1:
+            self.current_char = None
+        else:
+            self.current_char = self.text[self.pos]
+        return Lexer.get_next_token(self)
+
+
+class TokenBuffer:
+    '''A lexed program stored as parallel arrays of token type codes,
+    values and start offsets, ending with an EOF token.
+
+    Once built it is immutable, so it can be cached and parsed any number
+    of times; `Parser` accepts a buffer in place of a lexer and reads it
+    through a `TokenReader` of its own.
+    '''
+    __slots__ = ("codes", "values", "offsets")
+
+    def __init__(self):
+        self.codes = array.array("B")
+        self.values = []
+        self.offsets = array.array("q")
+
+    def append(self, token, offset):
+        self.codes.append(TOKEN_CODES[token.type])
+        self.values.append(token.value)
+        self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def type_at(self, index):
+        return TOKEN_TYPES[self.codes[index]]
+
+    def __getitem__(self, index):
+        code = self.codes[index]
+        token = FIXED_TOKENS[code]
+        if token is None:
+            token = Token(TOKEN_TYPES[code], self.values[index])
+        return token
+
+    def __iter__(self):
+        for index in range(len(self.codes)):
+            yield self[index]
+
+    def reader(self):
+        return TokenReader(self)
+
+
+class TokenReader:
+    '''Hands the tokens of a `TokenBuffer` out one at a time, like a
+    `Lexer`, with lookahead at any distance.
+    '''
+    __slots__ = ("buffer", "codes", "values", "offsets", "last", "pos",
+                 "token_start")
+
+    def __init__(self, buffer):
+        if not len(buffer):
+            raise ValueError("Empty token buffer")
+        self.buffer = buffer
+        self.codes = buffer.codes
+        self.values = buffer.values
+        self.offsets = buffer.offsets
+        self.last = len(buffer) - 1
+        self.pos = 0
+        self.token_start = 0
+
+    def get_next_token(self):
+        # EOF is the last token and is returned again once reached
+        pos = self.pos
+        if pos < self.last:
+            self.pos = pos + 1
+        self.token_start = self.offsets[pos]
+        code = self.codes[pos]
+        token = FIXED_TOKENS[code]
+        if token is None:
+            token = Token(TOKEN_TYPES[code], self.values[pos])
+        return token
+
+    def lookahead(self, distance=1):
+        '''Returns the type of the token `distance` tokens after the one
+        last returned by `get_next_token`.
+        '''
+        return self.buffer.type_at(min(self.pos + distance - 1, self.last))
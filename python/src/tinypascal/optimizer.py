@@ -0,0 +1,107 @@
+'''Optimization passes run over a parsed program before it is executed.
+'''
+import operator
+
+from .interpreter import NodeVisitor
+from .lexer import Token, TokenType
+from .parser import Assign, BinOp, Compound, Num, UnaryOp, walk
+
+
+OPERATIONS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.MUL: operator.mul,
+    TokenType.DIV: operator.truediv,
+}
+
+
+def is_constant(node, value):
+    '''Checks `node` is a `Num` of exactly the int `value`; `1.0` is no
+    identity for `*` as it would turn an int operand into a float.
+    '''
+    return (
+        isinstance(node, Num) and type(node.value) is int
+        and node.value == value
+    )
+
+
+class ConstantFolder(NodeVisitor):
+    '''Folds constant subtrees into `Num` nodes and drops identity operations.
+
+    Constant `BinOp`/`UnaryOp` subtrees are evaluated with the interpreter's
+    semantics, so `DIV` still yields floats; operations that would raise,
+    like a division by zero, are kept for the error to surface at run time.
+    `x * 1`, `1 * x`, `x + 0`, `0 + x`, `x - 0`, `+ x` and `- - x` simplify
+    to `x`. Note `x + 0` turns a float `-0.0` into `0.0`, which compares
+    equal.
+
+    The number of nodes taken out of the tree is kept in `removed`.
+    '''
+    def __init__(self):
+        self.removed = 0
+
+    def fold(self, tree):
+        before = sum(1 for _ in walk(tree))
+        tree = self.visit(tree)
+        self.removed += before - sum(1 for _ in walk(tree))
+        return tree
+
+    def visit_Assign(self, node):
+        return Assign(node.left, node.op, self.visit(node.right))
+
+    def visit_BinOp(self, node):
+        left, right = self.visit(node.left), self.visit(node.right)
+        op = node.op.type
+        if isinstance(left, Num) and isinstance(right, Num):
+            try:
+                value = OPERATIONS[op](left.value, right.value)
+            except (ArithmeticError, ValueError):
+                pass
+            else:
+                return Num(Token(TokenType.INTEGER, value))
+
+        if op == TokenType.MUL:
+            if is_constant(right, 1):
+                return left
+            if is_constant(left, 1):
+                return right
+        elif op == TokenType.PLUS:
+            if is_constant(right, 0):
+                return left
+            if is_constant(left, 0):
+                return right
+        elif op == TokenType.MINUS and is_constant(right, 0):
+            return left
+        return BinOp(left, node.op, right)
+
+    def visit_Compound(self, node):
+        root = Compound()
+        root.children = [self.visit(child) for child in node.children]
+        return root
+
+    def visit_UnaryOp(self, node):
+        expr = self.visit(node.expr)
+        if node.op.type == TokenType.PLUS:
+            return expr
+        if isinstance(expr, Num):
+            return Num(Token(TokenType.INTEGER, - expr.value))
+        if isinstance(expr, UnaryOp) and expr.op.type == TokenType.MINUS:
+            return expr.expr
+        return UnaryOp(node.op, expr)
+
+    def visit_Num(self, node):
+        return node
+
+    def visit_NoOp(self, node):
+        return node
+
+    def visit_Var(self, node):
+        return node
+
+
+def fold_constants(tree):
+    '''Returns the folded tree and the number of nodes removed from it.
+    '''
+    folder = ConstantFolder()
+    tree = folder.fold(tree)
+    return tree, folder.removed
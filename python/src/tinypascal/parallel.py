@@ -0,0 +1,113 @@
+'''Runs many independent programs across a pool of worker processes.
+'''
+import collections
+import concurrent.futures
+import json
+import os
+import time
+
+from .budget import BudgetExceeded
+from .cache import ProgramCache
+from .interpreter import Interpreter
+
+
+# Final scope of a program and, if it failed, a dict with the `type` and
+# `message` of the error; the scope then holds what was assigned before it.
+ProgramResult = collections.namedtuple('ProgramResult', ['scope', 'error'])
+
+
+class RunStats(collections.namedtuple('RunStats', [
+        'programs', 'errors', 'elapsed', 'workers'])):
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        '''Programs run per second.
+        '''
+        return self.programs / self.elapsed if self.elapsed else 0.0
+
+
+# Programs parsed by the current process; workers keep theirs between tasks.
+_cache = ProgramCache()
+
+
+def evaluate(text, engine='tree', scope=None, budget=None):
+    '''Runs a single program, starting from the bindings of `scope` if
+    given, reporting a failure in the result instead of raising it.
+
+    A run stopped by its `budget.Budget` is reported with the `limit` it
+    broke and its partial `stats` in the error.
+    '''
+    interpreter = Interpreter(None, engine=engine, budget=budget)
+    if scope:
+        interpreter.GLOBAL_SCOPE.update(scope)
+    try:
+        interpreter.execute(_cache.parse(text))
+    except Exception as ex:
+        error = {'type': type(ex).__name__, 'message': str(ex)}
+        if isinstance(ex, BudgetExceeded):
+            error.update(limit=ex.limit, stats=ex.stats)
+        return ProgramResult(interpreter.GLOBAL_SCOPE, error)
+    return ProgramResult(interpreter.GLOBAL_SCOPE, None)
+
+
+def encode_result(record):
+    '''Returns the JSON line, without its newline, reporting the result of
+    a program in `record`, a dict with its `scope` and `error`, and the
+    error reported.
+
+    A scope JSON can't hold, say one with an int of more digits than
+    `sys.get_int_max_str_digits` allows, is reported as None, with a
+    ValueError instead of the program's error.
+    '''
+    try:
+        return json.dumps(record), record['error']
+    except ValueError as ex:
+        error = {'type': 'ValueError',
+                 'message': 'Scope cannot be encoded: {}'.format(ex)}
+        return json.dumps(dict(record, scope=None, error=error)), error
+
+
+def evaluate_chunk(texts, engine='tree'):
+    return [evaluate(text, engine) for text in texts]
+
+
+def run_parallel(sources, engine='tree', max_workers=None, chunksize=64,
+                 progress=None):
+    '''Runs each program text of `sources` in a `ProcessPoolExecutor`.
+
+    Programs are sent to the workers `chunksize` at a time; the worker
+    processes live for the whole run so the package is imported once per
+    worker. `progress`, if given, is called with the number of programs
+    done and the total after each chunk completes.
+
+    Returns the list of `ProgramResult`, in the order of `sources`, and the
+    `RunStats` of the run.
+    '''
+    sources = list(sources)
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = [sources[start:start + chunksize]
+              for start in range(0, len(sources), chunksize)]
+
+    started = time.perf_counter()
+    results, done = [None] * len(chunks), 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = {
+            executor.submit(evaluate_chunk, chunk, engine): index
+            for index, chunk in enumerate(chunks)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            done += len(results[index])
+            if progress is not None:
+                progress(done, len(sources))
+
+    results = [result for chunk in results for result in chunk]
+    stats = RunStats(
+        programs=len(results),
+        errors=sum(1 for result in results if result.error is not None),
+        elapsed=time.perf_counter() - started,
+        workers=max_workers,
+    )
+    return results, stats
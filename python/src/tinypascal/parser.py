@@ -1,26 +1,43 @@
-from .lexer import TokenType
+from .lexer import TokenBuffer, TokenType
 
 
 class AST:
     '''Base class for all nodes within an Abstract-Syntax Tree.
+
+    Nodes declare `__slots__` as programs can have millions of them; the
+    operator nodes expose their `op` token as `token` as well.
     '''
-    pass
+    __slots__ = ()
 
 
 class BinOp(AST):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
 
+    @property
+    def token(self):
+        return self.op
+
 
 class UnaryOp(AST):
+    __slots__ = ('op', 'expr')
+
     def __init__(self, op, expr):
-        self.token = self.op = op
+        self.op = op
         self.expr = expr
 
+    @property
+    def token(self):
+        return self.op
+
 
 class Num(AST):
+    __slots__ = ('token', 'value')
+
     def __init__(self, token):
         self.token = token
         self.value = token.value
@@ -29,34 +46,81 @@ class Num(AST):
 class Compound(AST):
     '''Represents a 'BEGIN ... END' block.
     '''
+    __slots__ = ('children',)
+
     def __init__(self):
         self.children = []
 
 
 class Assign(AST):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
 
+    @property
+    def token(self):
+        return self.op
+
 
 class Var(AST):
     '''The Var node is constructed out of ID token.
     '''
+    __slots__ = ('token', 'value')
+
     def __init__(self, token):
         self.token = token
         self.value = token.value
 
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
+
+
+def walk(node):
+    '''Yields `node` and all the nodes below it, without recursing.
+    '''
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        yield node
+        if isinstance(node, (BinOp, Assign)):
+            pending.append(node.right)
+            pending.append(node.left)
+        elif isinstance(node, UnaryOp):
+            pending.append(node.expr)
+        elif isinstance(node, Compound):
+            pending.extend(reversed(node.children))
+
+
+# Binding power of the binary operators in `Parser.climb_expr`; an open
+# parenthesis binds weakest so that no operator is reduced past it.
+PRECEDENCE = {
+    TokenType.PLUS: 1,
+    TokenType.MINUS: 1,
+    TokenType.MUL: 2,
+    TokenType.DIV: 2,
+}
+PAREN = 0
 
 
 class Parser:
+    '''Builds the AST of a program from the tokens of a `Lexer`, or of an
+    already lexed `TokenBuffer`.
 
-    def __init__(self, lexer):
+    With `iterative` set, expressions are parsed by `climb_expr` instead of
+    the recursive `expr`, `term` and `factor`, building the same trees.
+    '''
+
+    def __init__(self, lexer, iterative=False):
+        if isinstance(lexer, TokenBuffer):
+            lexer = lexer.reader()
         self.lexer = lexer
         self.current_token = lexer.get_next_token()
+        if iterative:
+            self.expr = self.climb_expr
 
     def error(self, error_code=0):
         raise Exception('Error parsing input')
@@ -128,6 +192,70 @@ class Parser:
             node = BinOp(node, token, self.term())
         return node
 
+    def climb_expr(self):
+        '''Parses an expression without recursing, by precedence climbing
+        over explicit stacks of operands and pending operators.
+
+        Prefix operators and open parentheses wait on the operator stack
+        until the operand they apply to is complete, so nesting is only
+        bounded by memory and each token costs constant time.
+        '''
+        get_next_token = self.lexer.get_next_token
+        operands, operators, depth = [], [], 0
+        token = self.current_token
+
+        def reduce():
+            op = operators.pop()[1]
+            right = operands.pop()
+            operands[-1] = BinOp(operands[-1], op, right)
+
+        while True:
+            # prefix operators and parentheses, then the innermost factor
+            while token.type in (TokenType.PLUS, TokenType.MINUS,
+                                 TokenType.LPAREN):
+                if token.type == TokenType.LPAREN:
+                    operators.append((PAREN, token))
+                    depth += 1
+                else:
+                    operators.append((None, token))
+                token = get_next_token()
+            if token.type == TokenType.INTEGER:
+                operands.append(Num(token))
+            elif token.type == TokenType.ID:
+                operands.append(Var(token))
+            else:
+                self.current_token = token
+                self.error()
+            token = get_next_token()
+
+            # apply the prefix operators to the complete factor, closing as
+            # many parenthesised expressions as end here
+            while True:
+                while operators and operators[-1][0] is None:
+                    operands[-1] = UnaryOp(operators.pop()[1], operands[-1])
+                if token.type != TokenType.RPAREN or not depth:
+                    break
+                while operators[-1][0] != PAREN:
+                    reduce()
+                operators.pop()
+                depth -= 1
+                token = get_next_token()
+
+            precedence = PRECEDENCE.get(token.type)
+            if precedence is None:
+                break
+            while operators and operators[-1][0] >= precedence:
+                reduce()
+            operators.append((precedence, token))
+            token = get_next_token()
+
+        self.current_token = token
+        if depth:
+            self.error()
+        while operators:
+            reduce()
+        return operands[0]
+
     def empty(self):
         '''An empty production.
         '''
@@ -195,6 +323,24 @@ class Parser:
         self.eat(TokenType.DOT)
         return node
 
+    def iter_statements(self):
+        '''Parses a program one top-level statement at a time, yielding each
+        statement of its outermost compound as soon as it is complete.
+        '''
+        self.eat(TokenType.BEGIN)
+        yield self.statement()
+        while self.current_token.type == TokenType.SEMI:
+            self.eat(TokenType.SEMI)
+            yield self.statement()
+
+        if self.current_token.type == TokenType.ID:
+            self.error()
+
+        self.eat(TokenType.END)
+        self.eat(TokenType.DOT)
+        if self.current_token.type != TokenType.EOF:
+            self.error()
+
     def parse(self):
         node = self.program()
         if self.current_token.type != TokenType.EOF:
@@ -0,0 +1,226 @@
+'''Opt-in profiling of the lexer, parser and tree walking interpreter.
+
+The instrumented `ProfiledLexer`, `ProfiledParser` and `ProfiledInterpreter`
+are separate from the classes they wrap and report everything to a shared
+`Profile`, so running without them costs nothing at all:
+
+    profile = Profile()
+    scope = run_profiled(text, profile)
+    print(profile.to_json())
+
+A `Profile` records the wall time of each phase, the tokens lexed by type,
+the nodes parsed by class, the calls and cumulative time of every grammar
+rule and `visit_*` method, and how often each variable was read and
+assigned. The time of every call stack can be written as a collapsed-stack
+file for flamegraph tools.
+'''
+import collections
+import contextlib
+import json
+import time
+
+from .interpreter import Interpreter
+from .lexer import Lexer
+from .parser import Parser, walk
+
+
+class Profile:
+    '''Statistics collected while running a program.
+
+    `phases` holds the time spent in each phase excluding the phases nested
+    in it; as the parser pulls tokens from the lexer, `'lex'` is nested in
+    and not counted in `'parse'`. `calls` and `cumulative` are keyed by the
+    instrumented function, the cumulative time of a recursive function
+    counting each outermost call only. `stacks` holds the time spent in each
+    call stack, excluding the calls it made.
+    '''
+    def __init__(self):
+        self.phases = collections.defaultdict(float)
+        self.tokens = collections.Counter()
+        self.nodes = collections.Counter()
+        self.calls = collections.Counter()
+        self.cumulative = collections.defaultdict(float)
+        self.stacks = collections.defaultdict(float)
+        self.reads = collections.Counter()
+        self.writes = collections.Counter()
+        # [name, time spent in nested calls, start time] of each active call
+        self._frames = []
+        self._active = collections.Counter()
+        # [name, time spent in nested phases] of each active phase
+        self._phases = []
+
+    def enter(self, name):
+        self._active[name] += 1
+        self._frames.append([name, 0.0, time.perf_counter()])
+
+    def leave(self):
+        name, nested, started = self._frames[-1]
+        elapsed = time.perf_counter() - started
+        self.stacks[';'.join(frame[0] for frame in self._frames)] += \
+            elapsed - nested
+        self._frames.pop()
+        if self._frames:
+            self._frames[-1][1] += elapsed
+
+        self.calls[name] += 1
+        self._active[name] -= 1
+        if not self._active[name]:
+            self.cumulative[name] += elapsed
+        return elapsed
+
+    def call(self, name, function, *args):
+        self.enter(name)
+        try:
+            return function(*args)
+        finally:
+            self.leave()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._phases.append([name, 0.0])
+        self.enter(name)
+        try:
+            yield
+        finally:
+            elapsed = self.leave()
+            _, nested = self._phases.pop()
+            self.phases[name] += elapsed - nested
+            if self._phases:
+                self._phases[-1][1] += elapsed
+
+    def count_nodes(self, tree):
+        self.nodes.update(type(node).__name__ for node in walk(tree))
+
+    def hottest(self, count=10):
+        '''Returns the `count` most used variables as `(name, reads, writes)`
+        tuples, most used first.
+        '''
+        uses = self.reads + self.writes
+        return [(name, self.reads[name], self.writes[name])
+                for name, _ in uses.most_common(count)]
+
+    def to_dict(self, variables=10):
+        return {
+            'phases': dict(self.phases),
+            'tokens': dict(self.tokens),
+            'nodes': dict(self.nodes),
+            'functions': {
+                name: {'calls': self.calls[name],
+                       'cumulative': self.cumulative[name]}
+                for name in sorted(self.calls)
+            },
+            'variables': [
+                {'name': name, 'reads': reads, 'writes': writes}
+                for name, reads, writes in self.hottest(variables)
+            ],
+        }
+
+    def to_json(self, variables=10, **kwargs):
+        return json.dumps(self.to_dict(variables), **kwargs)
+
+    def write_collapsed(self, fp):
+        '''Writes one `frame;frame;... microseconds` line per call stack,
+        the format flamegraph.pl and speedscope read.
+        '''
+        for stack, elapsed in sorted(self.stacks.items()):
+            microseconds = int(round(elapsed * 1e6))
+            if microseconds:
+                fp.write('{} {}\n'.format(stack, microseconds))
+
+
+class ProfiledLexer:
+    '''Counts and times the tokens a lexer returns.
+    '''
+    def __init__(self, lexer, profile):
+        self.lexer = lexer
+        self.profile = profile
+
+    def get_next_token(self):
+        with self.profile.phase('lex'):
+            token = self.lexer.get_next_token()
+        self.profile.tokens[token.type.name] += 1
+        return token
+
+    def __getattr__(self, name):
+        return getattr(self.lexer, name)
+
+
+def profiled(method):
+    '''Wraps a `Parser` grammar rule so its calls are recorded.
+    '''
+    name = 'Parser.' + method.__name__
+
+    def wrapper(self, *args):
+        return self.profile.call(name, method, self, *args)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class ProfiledParser(Parser):
+    '''A `Parser` recording the calls of its grammar rules.
+    '''
+    def __init__(self, lexer, profile):
+        self.profile = profile
+        super().__init__(lexer)
+
+    program = profiled(Parser.program)
+    compound_statement = profiled(Parser.compound_statement)
+    statement_list = profiled(Parser.statement_list)
+    statement = profiled(Parser.statement)
+    assignment_statement = profiled(Parser.assignment_statement)
+    variable = profiled(Parser.variable)
+    empty = profiled(Parser.empty)
+    expr = profiled(Parser.expr)
+    term = profiled(Parser.term)
+    factor = profiled(Parser.factor)
+
+
+class ProfiledInterpreter(Interpreter):
+    '''An `Interpreter` recording its visits and the variables it uses.
+
+    Only the 'tree' engine visits nodes; other engines are timed as a
+    whole.
+    '''
+    def __init__(self, parser, profile, engine='tree', optimize=False):
+        super().__init__(parser, engine, optimize)
+        self.profile = profile
+
+    def visit(self, node):
+        try:
+            visitor = self._visitors[type(node)]
+        except KeyError:
+            visitor = self._resolve_visitor(type(node))
+        return self.profile.call(
+            'Interpreter.' + visitor.__name__, visitor, self, node
+        )
+
+    def visit_Assign(self, node):
+        super().visit_Assign(node)
+        self.profile.writes[node.left.value] += 1
+
+    def visit_Var(self, node):
+        self.profile.reads[node.value] += 1
+        return super().visit_Var(node)
+
+    def execute(self, tree):
+        with self.profile.phase('execute'):
+            return super().execute(tree)
+
+    def run(self):
+        with self.profile.phase('parse'):
+            tree = self.parser.parse()
+        self.profile.count_nodes(tree)
+        return self.execute(tree)
+
+
+def run_profiled(text, profile, scope=None, engine='tree', optimize=False):
+    '''Runs the program `text` with every phase recorded in `profile` and
+    returns the final scope.
+    '''
+    with profile.phase('parse'):
+        parser = ProfiledParser(ProfiledLexer(Lexer(text), profile), profile)
+    interpreter = ProfiledInterpreter(parser, profile, engine, optimize)
+    interpreter.GLOBAL_SCOPE.update(scope or {})
+    interpreter.run()
+    return interpreter.GLOBAL_SCOPE
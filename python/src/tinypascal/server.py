@@ -0,0 +1,283 @@
+'''Long-lived evaluation server, behind `python -m tinypascal serve`.
+
+Clients connect over a Unix socket or localhost TCP and send requests as
+JSON Lines; each response is a single JSON line too:
+
+    {"id": 1, "program": "BEGIN b := a * 2 END.", "scope": {"a": 21}}
+    {"id": 1, "scope": {"a": 21, "b": 42}, "error": null, "elapsed": 0.0004}
+
+`id` is any JSON value identifying the request, `scope` the optional
+initial bindings, all of them numbers, and `engine` optionally one of the
+`ENGINES`. Requests of a connection may be pipelined; their responses are
+written as they complete, so not necessarily in order.
+`{"id": ..., "stats": true}` returns the server's `ServerStats` instead.
+A run whose final scope JSON can't hold, say an int of more digits than
+`sys.get_int_max_str_digits` allows, is answered with a ValueError.
+
+With a `budget.Budget`, every run is limited to it and a run going over it
+is answered with a `BudgetExceeded` error carrying its partial `stats`, so
+a runaway program frees its worker early.
+
+Programs run on a pool of worker processes, each keeping the programs it
+parsed warm in its cache across requests. At most `max_pending` requests
+are accepted at a time; past that the server stops reading from its
+clients until a request completes, so they are slowed down by the socket
+buffers filling up rather than queueing without bound.
+'''
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from .interpreter import ENGINES
+from .parallel import encode_result, evaluate
+
+
+# Longest request line accepted.
+LINE_LIMIT = 16 * 2 ** 20
+
+# Number of most recent request latencies percentiles are computed over.
+LATENCY_WINDOW = 10000
+
+
+class ServerStats:
+    '''Request counts, queue depth and latency percentiles of a server.
+
+    `pending` counts the programs handed to the pool and not yet run, of
+    which `queued` are still waiting for a worker.
+    '''
+    def __init__(self, workers):
+        self.workers = workers
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.pending = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def queued(self):
+        return max(0, self.pending - self.workers)
+
+    def percentile(self, percent):
+        '''Returns the latency, in seconds, below which `percent` of the
+        recent requests completed, using the nearest rank.
+        '''
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        rank = -(-len(latencies) * percent // 100)
+        return latencies[max(rank, 1) - 1]
+
+    def record(self, latency, error):
+        self.requests += 1
+        self.errors += error is not None
+        self.latencies.append(latency)
+
+    def to_dict(self):
+        return {
+            'connections': self.connections,
+            'requests': self.requests,
+            'errors': self.errors,
+            'pending': self.pending,
+            'queued': self.queued,
+            'workers': self.workers,
+            'latency': {
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': max(self.latencies, default=0.0),
+            },
+        }
+
+
+def valid_scope(scope):
+    '''Checks the initial bindings of a request hold nothing but numbers;
+    a string `a` would make `a * 100000000000` allocate gigabytes.
+    '''
+    if scope is None:
+        return True
+    return isinstance(scope, dict) and all(
+        type(value) in (int, float) for value in scope.values()
+    )
+
+
+def ignore_interrupts():
+    # workers are stopped by the server, not by the Ctrl-C meant for it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class EvaluationServer:
+    '''Serves program evaluations on a pool of `max_workers` processes.
+    '''
+    def __init__(self, max_workers=None, max_pending=None, engine='tree',
+                 budget=None):
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine: {!r}'.format(engine))
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.engine = engine
+        self.budget = budget
+        self.stats = ServerStats(self.max_workers)
+        self.executor = None
+        self.server = None
+        self.slots = None
+        self.writers = set()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        '''Starts listening on the Unix socket `path`, or on `host` and
+        `port` if no path is given, and returns the `asyncio` server.
+        '''
+        self.executor = self.start_workers()
+        self.slots = asyncio.Semaphore(self.max_pending)
+        if path is not None:
+            self.server = await asyncio.start_unix_server(
+                self.handle, path=path, limit=LINE_LIMIT
+            )
+        else:
+            self.server = await asyncio.start_server(
+                self.handle, host, port, limit=LINE_LIMIT
+            )
+        return self.server
+
+    def start_workers(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            self.max_workers, initializer=ignore_interrupts
+        )
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def handle(self, reader, writer):
+        self.stats.connections += 1
+        self.writers.add(writer)
+        lock, tasks = asyncio.Lock(), set()
+
+        async def respond(line):
+            async with lock:
+                writer.write(line.encode('utf-8') + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                # waiting for a slot before reading the next request is
+                # what pushes back on clients sending faster than we run
+                await self.slots.acquire()
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    line = b''
+                if not line:
+                    self.slots.release()
+                    break
+                task = asyncio.ensure_future(self.answer(line, respond))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            self.stats.connections -= 1
+            self.writers.discard(writer)
+            writer.close()
+
+    async def answer(self, line, respond):
+        started = time.perf_counter()
+        try:
+            response = await self.run(line)
+        finally:
+            self.slots.release()
+
+        if 'stats' in response:
+            line = json.dumps(response)
+        else:
+            response['elapsed'] = time.perf_counter() - started
+            line, error = encode_result(response)
+            self.stats.record(response['elapsed'], error)
+        try:
+            await respond(line)
+        except ConnectionError:
+            pass
+
+    async def run(self, line):
+        '''Returns the response to a request line.
+        '''
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+        except ValueError as ex:
+            return {'id': None, 'scope': None,
+                    'error': {'type': 'ValueError', 'message': str(ex)}}
+
+        if request.get('stats'):
+            return {'id': request.get('id'), 'stats': self.stats.to_dict()}
+
+        engine = request.get('engine', self.engine)
+        program, scope = request.get('program'), request.get('scope')
+        if not isinstance(engine, str) or engine not in ENGINES or \
+                not isinstance(program, str) or not valid_scope(scope):
+            return {'id': request.get('id'), 'scope': None,
+                    'error': {'type': 'ValueError',
+                              'message': 'Invalid request'}}
+
+        loop = asyncio.get_event_loop()
+        executor = self.executor
+        self.stats.pending += 1
+        try:
+            result = await loop.run_in_executor(
+                executor, evaluate, program, engine, scope, self.budget
+            )
+        except Exception as ex:
+            if isinstance(ex, BrokenProcessPool) and \
+                    executor is self.executor:
+                # a worker died, say killed for running out of memory;
+                # the pool can't be used any more
+                executor.shutdown(wait=False)
+                self.executor = self.start_workers()
+            return {'id': request.get('id'), 'scope': None,
+                    'error': {'type': type(ex).__name__,
+                              'message': str(ex)}}
+        finally:
+            self.stats.pending -= 1
+        return {'id': request.get('id'), 'scope': result.scope,
+                'error': result.error}
+
+
+def serve(path=None, host='127.0.0.1', port=0, max_workers=None,
+          max_pending=None, engine='tree', budget=None, ready=None):
+    '''Runs an `EvaluationServer` until interrupted or terminated. `ready`,
+    if given, is called with the address listened on once the server
+    accepts clients.
+    '''
+    server = EvaluationServer(max_workers, max_pending, engine, budget)
+    loop = asyncio.new_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, loop.stop)
+        except NotImplementedError:
+            pass
+    try:
+        loop.run_until_complete(server.start(path, host, port))
+        if ready is not None:
+            ready(server.address)
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
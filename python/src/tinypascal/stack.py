@@ -0,0 +1,95 @@
+'''Tree walking evaluation on an explicit stack.
+
+`StackEvaluator` visits the nodes of a tree in the same order as
+`Interpreter`, but keeps the nodes still to visit and the values computed
+so far on two lists instead of the Python call stack. Trees of any depth,
+such as the left-leaning chains `Parser(lexer, iterative=True)` builds for
+`a + a + ... + a`, are evaluated with the same results and errors without
+ever hitting the recursion limit.
+'''
+import operator
+
+from .lexer import TokenType
+from .parser import Assign, BinOp, Compound, NoOp, Num, UnaryOp, Var
+
+
+# Entries pushed after a node's operands, applying it once they have been
+# evaluated: `(BINARY, function)`, `(UNARY, function)` or `(STORE, name)`.
+BINARY = 0
+UNARY = 1
+STORE = 2
+
+BINARY_OPERATIONS = {
+    TokenType.PLUS: (BINARY, operator.add),
+    TokenType.MINUS: (BINARY, operator.sub),
+    TokenType.MUL: (BINARY, operator.mul),
+    TokenType.DIV: (BINARY, operator.truediv),
+}
+
+UNARY_OPERATIONS = {
+    TokenType.PLUS: (UNARY, operator.pos),
+    TokenType.MINUS: (UNARY, operator.neg),
+}
+
+
+class StackEvaluator:
+    '''Evaluates trees against `scope` without recursing.
+    '''
+    def __init__(self, scope=None):
+        self.scope = {} if scope is None else scope
+
+    def evaluate(self, tree):
+        '''Evaluates `tree`, returning the value of an expression or None
+        for a statement.
+        '''
+        scope = self.scope
+        pending, values = [tree], []
+        push, pop = pending.append, pending.pop
+        while pending:
+            item = pop()
+            kind = type(item)
+            if kind is tuple:
+                code, arg = item
+                if code == BINARY:
+                    right = values.pop()
+                    values[-1] = arg(values[-1], right)
+                elif code == UNARY:
+                    values[-1] = arg(values[-1])
+                else:
+                    scope[arg] = values.pop()
+            elif kind is Num:
+                values.append(item.value)
+            elif kind is Var:
+                value = scope.get(item.value)
+                if value is None:
+                    raise NameError(repr(item.value))
+                values.append(value)
+            elif kind is BinOp:
+                push(BINARY_OPERATIONS[item.op.type])
+                push(item.right)
+                push(item.left)
+            elif kind is UnaryOp:
+                push(UNARY_OPERATIONS[item.op.type])
+                push(item.expr)
+            elif kind is Assign:
+                push((STORE, item.left.value))
+                push(item.right)
+            elif kind is Compound:
+                pending.extend(reversed(item.children))
+            elif kind is not NoOp:
+                raise Exception('No visit_{} method'.format(kind.__name__))
+        return values[-1] if values else None
+
+
+class StackProgram:
+    '''A parsed program run by a `StackEvaluator`.
+    '''
+    def __init__(self, tree):
+        self.tree = tree
+
+    def execute(self, scope):
+        return StackEvaluator(scope).evaluate(self.tree)
+
+
+def compile_program(tree):
+    return StackProgram(tree)
@@ -0,0 +1,256 @@
+'''Bytecode compiler and stack based virtual machine.
+
+The AST is lowered once into a flat sequence of `(opcode, argument)` pairs
+which the `VM` then runs in a single dispatch loop, so re-running a program
+costs neither visitor dispatch nor `TokenType` comparisons.
+
+Variables are resolved at compile time to indexes into a list of slots,
+one per distinct name, so the loop never hashes a name. The scope dict is
+only read when the slots are bound before a run and written back once
+after it.
+'''
+from .interpreter import NodeVisitor
+from .lexer import TokenType
+
+
+LOAD_CONST = 0
+LOAD_SLOT = 1
+STORE_SLOT = 2
+BINARY_ADD = 3
+BINARY_SUBTRACT = 4
+BINARY_MULTIPLY = 5
+BINARY_DIVIDE = 6
+UNARY_POSITIVE = 7
+UNARY_NEGATIVE = 8
+
+OPNAMES = {
+    LOAD_CONST: 'LOAD_CONST',
+    LOAD_SLOT: 'LOAD_SLOT',
+    STORE_SLOT: 'STORE_SLOT',
+    BINARY_ADD: 'BINARY_ADD',
+    BINARY_SUBTRACT: 'BINARY_SUBTRACT',
+    BINARY_MULTIPLY: 'BINARY_MULTIPLY',
+    BINARY_DIVIDE: 'BINARY_DIVIDE',
+    UNARY_POSITIVE: 'UNARY_POSITIVE',
+    UNARY_NEGATIVE: 'UNARY_NEGATIVE',
+}
+
+BINARY_OPCODES = {
+    TokenType.PLUS: BINARY_ADD,
+    TokenType.MINUS: BINARY_SUBTRACT,
+    TokenType.MUL: BINARY_MULTIPLY,
+    TokenType.DIV: BINARY_DIVIDE,
+}
+
+UNARY_OPCODES = {
+    TokenType.PLUS: UNARY_POSITIVE,
+    TokenType.MINUS: UNARY_NEGATIVE,
+}
+
+
+class Bytecode:
+    '''A compiled program; a tuple of `(opcode, argument)` instructions.
+
+    `names` holds the variable name of each slot and `stores` the slots
+    assigned by the program, in the order they are first assigned.
+    '''
+    def __init__(self, instructions, names=(), stores=()):
+        self.instructions = tuple(instructions)
+        self.names = tuple(names)
+        self.stores = tuple(stores)
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def dis(self):
+        '''Returns a human readable listing of the instructions.
+        '''
+        return '\n'.join(
+            '{:>4} {:<16} {}'.format(
+                offset, OPNAMES[op], self.format_arg(op, arg)
+            ).rstrip()
+            for offset, (op, arg) in enumerate(self.instructions)
+        )
+
+    def format_arg(self, op, arg):
+        if op in (LOAD_SLOT, STORE_SLOT):
+            return '{} ({})'.format(arg, self.names[arg])
+        return '' if arg is None else repr(arg)
+
+    def bind(self, scope):
+        '''Returns the list of slots holding the values of `scope`, None for
+        the unbound names.
+        '''
+        return [scope.get(name) for name in self.names]
+
+    def materialize(self, slots, scope=None):
+        '''Stores the slots assigned by the program into `scope`, a new dict
+        by default, adding new names in the order they were first assigned.
+        '''
+        scope = {} if scope is None else scope
+        names = self.names
+        for index in self.stores:
+            # assigned values are never None, so None means not yet assigned
+            value = slots[index]
+            if value is not None:
+                scope[names[index]] = value
+        return scope
+
+    def execute(self, scope):
+        return VM().execute(self, scope)
+
+
+class Compiler(NodeVisitor):
+    '''Lowers an AST into `Bytecode` with a post-order walk.
+    '''
+    def __init__(self):
+        self.instructions = []
+        self.slots = {}
+        # slots assigned by the program, ordered by their first assignment
+        self.stores = {}
+
+    def emit(self, op, arg=None):
+        self.instructions.append((op, arg))
+
+    def slot(self, name):
+        '''Returns the slot index of variable `name`, allocating it the
+        first time the name is seen.
+        '''
+        index = self.slots.get(name)
+        if index is None:
+            index = self.slots[name] = len(self.slots)
+        return index
+
+    def visit_Assign(self, node):
+        self.visit(node.right)
+        index = self.slot(node.left.value)
+        self.stores.setdefault(index)
+        self.emit(STORE_SLOT, index)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+        self.emit(BINARY_OPCODES[node.op.type])
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+        self.emit(UNARY_OPCODES[node.op.type])
+
+    def visit_Num(self, node):
+        self.emit(LOAD_CONST, node.value)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Var(self, node):
+        self.emit(LOAD_SLOT, self.slot(node.value))
+
+    def compile(self, tree):
+        self.visit(tree)
+        return Bytecode(self.instructions, self.slots, self.stores)
+
+
+class VM:
+    '''Runs `Bytecode` against a scope dict, e.g. `Interpreter.GLOBAL_SCOPE`.
+    '''
+    def execute(self, code, scope, meter=None):
+        '''Runs `code` against `scope`, within the budget of the
+        `budget.Meter` if one is given.
+        '''
+        slots = code.bind(scope)
+        try:
+            if meter is None:
+                self.run(code, slots)
+            else:
+                self.run_budgeted(code, slots, meter)
+        finally:
+            code.materialize(slots, scope)
+
+    def run(self, code, slots):
+        '''Runs `code` over a list of slots bound by `Bytecode.bind`.
+        '''
+        stack = []
+        push, pop = stack.append, stack.pop
+        for op, arg in code.instructions:
+            if op == LOAD_SLOT:
+                value = slots[arg]
+                if value is None:
+                    raise NameError(repr(code.names[arg]))
+                push(value)
+            elif op == LOAD_CONST:
+                push(arg)
+            elif op == BINARY_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == BINARY_SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == BINARY_MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == BINARY_DIVIDE:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif op == STORE_SLOT:
+                slots[arg] = pop()
+            elif op == UNARY_NEGATIVE:
+                stack[-1] = - stack[-1]
+            elif op == UNARY_POSITIVE:
+                stack[-1] = + stack[-1]
+
+    def run_budgeted(self, code, slots, meter):
+        '''Runs `code` like `run`, counting each instruction as a step of
+        `meter`.
+        '''
+        stack = []
+        push, pop = stack.append, stack.pop
+        steps, checkpoint = meter.steps, meter.checkpoint
+        check_bits = meter.max_bits is not None
+        try:
+            for op, arg in code.instructions:
+                steps += 1
+                if steps >= checkpoint:
+                    checkpoint = meter.check(steps)
+                if op == LOAD_SLOT:
+                    value = slots[arg]
+                    if value is None:
+                        raise NameError(repr(code.names[arg]))
+                    push(value)
+                    continue
+                elif op == LOAD_CONST:
+                    push(arg)
+                    continue
+                elif op == STORE_SLOT:
+                    slots[arg] = pop()
+                    continue
+                elif op == BINARY_ADD:
+                    right = pop()
+                    stack[-1] = stack[-1] + right
+                elif op == BINARY_SUBTRACT:
+                    right = pop()
+                    stack[-1] = stack[-1] - right
+                elif op == BINARY_MULTIPLY:
+                    right = pop()
+                    if check_bits:
+                        meter.check_product(stack[-1], right, steps)
+                    stack[-1] = stack[-1] * right
+                elif op == BINARY_DIVIDE:
+                    right = pop()
+                    stack[-1] = stack[-1] / right
+                elif op == UNARY_NEGATIVE:
+                    stack[-1] = - stack[-1]
+                elif op == UNARY_POSITIVE:
+                    stack[-1] = + stack[-1]
+                if check_bits:
+                    meter.check_bits(stack[-1], steps)
+        finally:
+            # a run may go on in the next call
+            meter.steps = steps
+
+
+def compile_program(tree):
+    return Compiler().compile(tree)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from tinypascal import Lexer, Parser, Interpreter
+from tinypascal.incremental import IncrementalProgram
+
+
+CODE = """BEGIN
+    a := 1;
+    b := a * 10;
+    BEGIN c := b + 1; d := 5 END;
+    e := d * 2;
+    f := c + e;
+END."""
+
+
+def full_run(text, scope=None):
+    it = Interpreter(Parser(Lexer(text)))
+    it.GLOBAL_SCOPE.update(scope or {})
+    it.run()
+    return it.GLOBAL_SCOPE
+
+
+def apply(program, old, new, occurrence=0):
+    start = -1
+    for _ in range(occurrence + 1):
+        start = program.text.index(old, start + 1)
+    return program.edit(start, start + len(old), new)
+
+
+def test_initial_run_matches_interpreter():
+    program = IncrementalProgram(CODE)
+    assert program.scope == full_run(CODE)
+    assert [s.node.__class__.__name__ for s in program.statements] == [
+        'Assign', 'Assign', 'Compound', 'Assign', 'Assign', 'NoOp'
+    ]
+
+
+@pytest.mark.parametrize('old, new, occurrence, executed', [
+    ('5', '6', 0, 3),           # d changes, so e and f follow
+    ('a * 10', 'a * 10 + 0', 0, 1),  # b keeps its value
+    ('a := 1', 'a := 2', 0, 4),
+    ('e := d * 2', 'e := d * 2; g := 7', 0, 2),
+    ('f := c + e;', 'f := c + e; a := 3', 0, 2),
+    ('b := a * 10;\n', '', 0, 3),   # dropping b fails c
+])
+def test_edits_match_full_run(old, new, occurrence, executed):
+    program = IncrementalProgram(CODE)
+    expected_text = CODE.replace(old, new, 1)
+    try:
+        expected = full_run(expected_text)
+    except NameError:
+        with pytest.raises(NameError):
+            apply(program, old, new, occurrence)
+        assert program.text == expected_text
+        return
+
+    stats = apply(program, old, new, occurrence)
+    assert program.text == expected_text
+    assert program.scope == expected
+    assert not stats.full_parse and not stats.full_run
+    assert stats.executed == executed
+
+
+def test_structural_edit_reparses_everything():
+    program = IncrementalProgram(CODE)
+    stats = apply(program, 'BEGIN c := b + 1; d := 5 END',
+                  'c := b + 1; d := 5')
+    assert not stats.full_parse and not stats.full_run
+    assert program.scope == full_run(program.text)
+
+    stats = apply(program, 'BEGIN\n', 'BEGIN x := 0;\n')
+    assert stats.full_parse and stats.full_run
+
+    with pytest.raises(Exception, match='Error parsing input'):
+        apply(program, 'd := 5', 'd := 5 END')
+    stats = apply(program, 'd := 5 END', 'd := 5')
+    assert stats.full_parse and stats.full_run
+    assert program.scope == full_run(program.text)
+
+
+def test_sequence_of_keystrokes():
+    program = IncrementalProgram(CODE, scope={'z': 4})
+    position = program.text.index('a := 1') + len('a := 1')
+    for char in ' + z * z':
+        try:
+            program.edit(position, position, char)
+        except Exception:
+            pass
+        position += 1
+    assert program.text == CODE.replace('a := 1', 'a := 1 + z * z')
+    assert program.scope == full_run(program.text, {'z': 4})
+    assert program.scope['f'] == 17 * 10 + 1 + 10
+
+
+def test_recovers_after_runtime_error():
+    program = IncrementalProgram(CODE)
+    with pytest.raises(ZeroDivisionError):
+        apply(program, 'a * 10', 'a / 0')
+    assert program.scope == {'a': 1}
+    apply(program, 'a / 0', 'a / 2')
+    assert program.scope == full_run(program.text)
+
+
+def test_edit_joining_tokens_across_statements():
+    program = IncrementalProgram('BEGIN a := 1; b := 2 END.')
+    start = program.text.index('b := 2 ')
+    with pytest.raises(Exception, match='Error parsing input'):
+        program.edit(start, start + len('b := 2 '), 'b := x')
+    assert program.text == 'BEGIN a := 1; b := xEND.'
+
+
+def test_edit_cost_does_not_grow_with_program_size():
+    import timeit
+
+    def edit_time(count):
+        program = IncrementalProgram('BEGIN {} END.'.format('; '.join(
+            'v{0} := {0} + 1'.format(i) for i in range(count)
+        )))
+        middle = 'v{0} := {0} + 1'.format(count // 2)
+        position = program.text.index(middle) + len(middle) - 1
+        digits = iter('23456789' * 10)
+
+        def edit():
+            stats = program.edit(position, position + 1, next(digits))
+            assert (stats.parsed, stats.executed) == (1, 1)
+        return min(timeit.repeat(edit, number=1, repeat=40))
+
+    # bookkeeping over every statement would make the larger program's
+    # edits about 40 times slower
+    assert edit_time(20000) < 5 * edit_time(500)
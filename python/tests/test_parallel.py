@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from tinypascal import main
+from tinypascal.parallel import run_parallel
+
+
+PROGRAMS = [
+    'BEGIN a := {0}; b := a * a END.'.format(i) for i in range(10)
+] + ['BEGIN a := 1; b := c END.', 'BEGIN a := END.']
+
+
+def test_results_keep_input_order():
+    progress = []
+    results, stats = run_parallel(
+        PROGRAMS, max_workers=2, chunksize=3,
+        progress=lambda done, total: progress.append((done, total))
+    )
+    assert [result.scope for result in results[:10]] == [
+        {'a': i, 'b': i * i} for i in range(10)
+    ]
+    assert results[10].scope == {'a': 1}
+    assert results[10].error == {'type': 'NameError', 'message': "'c'"}
+    assert results[11].error['message'] == 'Error parsing input'
+
+    assert (stats.programs, stats.errors, stats.workers) == (12, 2, 2)
+    assert stats.throughput > 0
+    assert len(progress) == 4 and progress[-1] == (12, 12)
+
+
+def test_parallel_command(tmp_path, capsys):
+    paths = []
+    for i, text in enumerate(PROGRAMS[9:]):
+        path = tmp_path / '{}.pas'.format(i)
+        path.write_text(text)
+        paths.append(str(path))
+
+    assert main(['parallel', '-j', '2', '--engine', 'vm'] + paths) == 1
+    out, err = capsys.readouterr()
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert [line['path'] for line in lines] == paths
+    assert lines[0]['scope'] == {'a': 9, 'b': 81}
+    assert lines[1]['error']['type'] == 'NameError'
+    assert '3 programs, 2 errors' in err
+
+
+def test_parallel_command_reports_unencodable_scopes(tmp_path, capsys):
+    # over 5000 digits, past the default limit on converting ints to str
+    big = 'BEGIN a := 99999999999999999999{} END.'.format('; a := a * a' * 8)
+    paths = []
+    for name, text in [('big', big), ('ok', PROGRAMS[1])]:
+        path = tmp_path / '{}.pas'.format(name)
+        path.write_text(text)
+        paths.append(str(path))
+
+    assert main(['parallel', '-q', '-j', '1'] + paths) == 1
+    out, err = capsys.readouterr()
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert [line['path'] for line in lines] == paths
+    assert lines[0]['scope'] is None
+    assert lines[0]['error']['type'] == 'ValueError'
+    assert lines[1] == {'path': paths[1], 'scope': {'a': 1, 'b': 1},
+                        'error': None}
+    assert '2 programs, 1 errors' in err
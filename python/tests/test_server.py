@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+from tinypascal.client import Client
+from tinypascal.server import EvaluationServer, ServerStats
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = EvaluationServer(max_workers=2, max_pending=4)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    def call(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    server.call = call
+    call(server.start(str(tmp_path / 'tinypascal.sock')))
+    yield server
+    call(server.close())
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_evaluates_programs(server):
+    with Client(server.address, timeout=30) as client:
+        response = client.evaluate('BEGIN b := a * 2 END.', {'a': 21})
+        assert response['id'] == 0
+        assert response['scope'] == {'a': 21, 'b': 42}
+        assert response['error'] is None and response['elapsed'] > 0
+
+        response = client.evaluate('BEGIN b := a / 2 END.', {'a': 1.5})
+        assert response['scope'] == {'a': 1.5, 'b': 0.75}
+
+        response = client.evaluate('BEGIN b := 1; c := x END.', engine='vm')
+        assert response['scope'] == {'b': 1}
+        assert response['error'] == {'type': 'NameError', 'message': "'x'"}
+
+        for request in [{'id': 'a', 'program': 1},
+                        {'id': 'b', 'program': 'BEGIN END.', 'engine': 'jit'},
+                        {'id': 'c', 'program': 'BEGIN END.', 'scope': [1]},
+                        {'id': 'd', 'program': 'BEGIN b := a * 3 END.',
+                         'scope': {'a': 'xy'}},
+                        {'id': 'e', 'program': 'BEGIN b := a END.',
+                         'scope': {'a': [1]}},
+                        {'id': 'f', 'program': 'BEGIN b := a END.',
+                         'scope': {'a': True}}]:
+            response = client.request(request)
+            assert response['id'] == request['id']
+            assert response['error']['type'] == 'ValueError'
+
+        client.file.write(b'not json\n')
+        client.file.flush()
+        assert client.receive()['error']['type'] == 'ValueError'
+
+
+def test_pipelined_requests_are_pushed_back(server):
+    programs = [('BEGIN b := a * a END.', {'a': i}) for i in range(200)]
+    with Client(server.address, timeout=30) as client:
+        responses = client.evaluate_many(programs, window=50)
+        assert [response['scope']['b'] for response in responses] == [
+            i * i for i in range(200)
+        ]
+        stats = client.stats()
+    assert stats['requests'] == 200 and stats['errors'] == 0
+    assert stats['pending'] == 0 and stats['workers'] == 2
+    assert 0 < stats['latency']['p50'] <= stats['latency']['p99'] \
+        <= stats['latency']['max']
+
+
+def test_answers_with_scopes_json_cannot_hold(server):
+    # over 5000 digits, past the default limit on converting ints to str
+    big = 'BEGIN a := 99999999999999999999{} END.'.format('; a := a * a' * 8)
+    with Client(server.address, timeout=30) as client:
+        response = client.evaluate(big)
+        assert response['id'] == 0 and response['scope'] is None
+        assert response['error']['type'] == 'ValueError'
+        response = client.evaluate('BEGIN a := 1 END.')
+        assert response['scope'] == {'a': 1}
+        assert client.stats()['errors'] == 1
+
+
+def test_recovers_from_dead_workers(server):
+    import os
+    import signal
+    with Client(server.address, timeout=30) as client:
+        assert client.evaluate('BEGIN a := 1 END.')['error'] is None
+        for pid in list(server.executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        response = client.evaluate('BEGIN a := 2 END.')
+        assert response['id'] == 1
+        assert response['error']['type'] == 'BrokenProcessPool'
+        response = client.evaluate('BEGIN a := 3 END.')
+        assert response['scope'] == {'a': 3}
+
+
+def test_listens_on_tcp():
+    server = EvaluationServer(max_workers=1)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(server.start(port=0))
+        host, port = server.address[:2]
+
+        def evaluate():
+            with Client(host=host, port=port, timeout=30) as client:
+                return client.evaluate('BEGIN a := 1 + 1 END.')
+        response = loop.run_until_complete(
+            loop.run_in_executor(None, evaluate)
+        )
+        assert response['scope'] == {'a': 2}
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
+
+
+def test_latency_percentiles():
+    stats = ServerStats(workers=1)
+    assert stats.percentile(50) == 0.0
+    for latency in range(1, 101):
+        stats.record(latency / 1000, None)
+    stats.record(1.0, {'type': 'NameError', 'message': "'x'"})
+    assert stats.percentile(50) == 0.051
+    assert stats.percentile(99) == 0.1
+    assert stats.to_dict()['latency']['max'] == 1.0
+    assert (stats.requests, stats.errors) == (101, 1)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Enforces the startup budget tracked in benchmarks/startup_budget.json;
+see benchmarks/startup.py for the full report.
+'''
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, 'benchmarks', 'startup_budget.json')
+
+PROGRAM = b'BEGIN a := 1; b := a + 2 END.\n'
+
+
+@pytest.fixture(scope='module')
+def budget():
+    with open(BUDGET_PATH, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def run(argv, stdin=None):
+    return subprocess.run(argv, input=stdin, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, check=True)
+
+
+@pytest.mark.parametrize('code', [
+    'import tinypascal',
+    'import tinypascal; tinypascal.main([])',
+])
+def test_heavy_modules_are_not_imported(code, budget):
+    process = run([sys.executable, '-c', code + (
+        "\nimport sys; sys.stderr.write('\\n'.join(sys.modules))"
+    )], PROGRAM)
+    modules = set(process.stderr.decode('utf-8').split('\n'))
+    assert not modules & set(budget['forbidden_modules'])
+
+
+def test_import_time(budget):
+    process = run([sys.executable, '-X', 'importtime', '-c',
+                   'import tinypascal'])
+    for line in process.stderr.decode('utf-8').splitlines():
+        _, cumulative, module = line.split('|')
+        if module.strip() == 'tinypascal':
+            assert int(cumulative) / 1000 <= budget['import_ms']
+            return
+    pytest.fail('tinypascal not found in the -X importtime output')
+
+
+def test_running_a_trivial_program(budget):
+    def best_time(argv, stdin=None):
+        best = None
+        for _ in range(5):
+            started = time.perf_counter()
+            process = run(argv, stdin)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, process
+
+    bare, _ = best_time([sys.executable, '-c', 'pass'])
+    elapsed, process = best_time([sys.executable, '-m', 'tinypascal'],
+                                 PROGRAM)
+    assert b"{'a': 1, 'b': 3}" in process.stdout
+    assert (elapsed - bare) * 1000 <= budget['run_overhead_ms']
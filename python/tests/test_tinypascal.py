@@ -2,9 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import pytest
-from tinypascal import get_version, TokenType, Lexer, Parser, Interpreter
+from tinypascal import (
+    get_version, TokenType, Lexer, Parser, NodeVisitor, Interpreter
+)
 
 
+ENGINES = ['tree', 'vm', 'closure', 'dataflow', 'stack']
+
 
 def test_version_detail():
     version = get_version()
@@ -17,10 +21,11 @@ class TestLexer:
         for token_type in token_types:
             assert lxr.get_next_token().type == token_type
 
-    def test_fails_for_empty_text(self):
-        with pytest.raises(IndexError):
-            lxr = Lexer('')
-            assert lxr.get_next_token().type == TokenType.EOF
+    @pytest.mark.parametrize('scanner', ['char', 'regex'])
+    @pytest.mark.parametrize('text', ['', ' \n ', iter([]), iter(['', ''])])
+    def test_empty_text_yields_eof(self, text, scanner):
+        lxr = Lexer(text, scanner=scanner)
+        assert lxr.get_next_token().type == TokenType.EOF
 
     def test_valid_lexical_analysis(self):
         lxr = Lexer('3 + 4')
@@ -45,9 +50,229 @@ class TestLexer:
             TokenType.DOT
         ])
 
+    def test_fails_for_unknown_scanner(self):
+        with pytest.raises(ValueError):
+            Lexer('3 + 4', scanner='lalr')
+
+
+class TestStreamedInput:
+
+    CODE = 'BEGIN number := 12; BEGIN a := number END; b := a * 100 END.'
+
+    def _token_values(self, lxr):
+        values = []
+        while True:
+            token = lxr.get_next_token()
+            if token.type == TokenType.EOF:
+                return values
+            values.append(token.value)
+
+    @pytest.mark.parametrize('scanner', ['char', 'regex'])
+    @pytest.mark.parametrize('size', [1, 2, 3, 7, 100])
+    def test_tokens_spanning_chunks(self, size, scanner):
+        chunks = (self.CODE[i:i + size]
+                  for i in range(0, len(self.CODE), size))
+        assert self._token_values(Lexer(chunks, scanner=scanner)) == \
+            self._token_values(Lexer(self.CODE))
+
+    @pytest.mark.parametrize('scanner', ['char', 'regex'])
+    def test_multibyte_characters_spanning_chunks(self, scanner):
+        code = 'BEGIN \u00e9t\u00e9 := 1 END.'.encode('utf-8')
+        chunks = (code[i:i + 1] for i in range(len(code)))
+        assert self._token_values(Lexer(chunks, scanner=scanner)) == \
+            ['BEGIN', '\u00e9t\u00e9', ':=', 1, 'END', '.']
+
+    def test_file_like_source(self):
+        import io
+        lxr = Lexer(io.StringIO(self.CODE))
+        assert self._token_values(lxr)[:4] == ['BEGIN', 'number', ':=', 12]
+        lxr = Lexer(io.BytesIO(self.CODE.encode('ascii')), scanner='regex')
+        assert self._token_values(lxr)[:4] == ['BEGIN', 'number', ':=', 12]
+
+    @pytest.mark.parametrize('scanner', ['char', 'regex'])
+    def test_path_and_mmap_sources(self, tmp_path, monkeypatch, scanner):
+        import mmap
+        from tinypascal import lexer
+        monkeypatch.setattr(lexer, 'CHUNK_SIZE', 4)
+        path = tmp_path / 'program.pas'
+        path.write_text(self.CODE)
+        expected = self._token_values(Lexer(self.CODE))
+        assert self._token_values(Lexer(path, scanner=scanner)) == expected
+
+        with open(str(path), 'rb') as fp:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                lxr = Lexer(mm, scanner=scanner)
+                assert self._token_values(lxr) == expected
+
+
+class TestRegexScanner:
+
+    def _tokens(self, text, scanner):
+        lxr, tokens = Lexer(text, scanner=scanner), []
+        while True:
+            try:
+                token = lxr.get_next_token()
+            except Exception as ex:
+                tokens.append(('error', type(ex)))
+                return tokens
+            tokens.append((token.type, token.value))
+            if token.type == TokenType.EOF:
+                return tokens
+
+    @pytest.mark.parametrize('text', [
+        '3 + 4',
+        '88 * 2 + 987',
+        'BEGIN a := 5; END.',
+        ' BEGIN\n\tx1 := (3+4)*-2 / y;\r\n END . ',
+        'BEGINx := ENDING; END.',
+        '12ab := a12',
+        'x \x1c:= 3',
+        'abc\u00e9 := \u00e9\u00e9; y := 1',
+        'x := 1\u00b2',
+        'a : = 1',
+        '3 # 4',
+    ])
+    def test_token_stream_matches_char_scanner(self, text):
+        assert self._tokens(text, 'regex') == self._tokens(text, 'char')
+
+    def test_interpreter_over_regex_scanner(self):
+        lxr = Lexer('BEGIN a := 2; b := 10 * a + 10 * a / 4 END.',
+                    scanner='regex')
+        it = Interpreter(Parser(lxr))
+        it.run()
+        assert it.GLOBAL_SCOPE == {'a': 2, 'b': 25}
+
+
+class TestTokenBuffer:
+
+    CODE = ' BEGIN\n\tx1 := (3+4)*-2 / y;\r\n END . '
+
+    @pytest.mark.parametrize('scanner', ['char', 'regex'])
+    def test_tokenize_matches_token_stream(self, scanner):
+        lxr, expected = Lexer(self.CODE, scanner=scanner), []
+        while True:
+            token = lxr.get_next_token()
+            expected.append((token.type, token.value, lxr.token_start))
+            if token.type == TokenType.EOF:
+                break
+
+        buffer = Lexer(self.CODE, scanner=scanner).tokenize()
+        assert buffer.codes.itemsize == 1
+        assert [(t.type, t.value) for t in buffer] == \
+            [(kind, value) for kind, value, _ in expected]
+        assert list(buffer.offsets) == [offset for _, _, offset in expected]
+
+    def test_reader_lookahead(self):
+        reader = Lexer('a := b * 2').tokenize().reader()
+        assert reader.lookahead() == TokenType.ID
+        assert reader.lookahead(3) == TokenType.ID
+        assert reader.get_next_token().value == 'a'
+        assert reader.lookahead(2) == TokenType.ID
+        assert reader.lookahead(10) == TokenType.EOF
+        for _ in range(5):
+            reader.get_next_token()
+        assert reader.get_next_token().type == TokenType.EOF
+        assert reader.get_next_token().type == TokenType.EOF
+        assert reader.token_start == 10
+
+    def test_parser_over_buffer(self):
+        import pickle
+        text = 'BEGIN a := 2; BEGIN b := 10 * -a + 10 / (a + 2) END END.'
+        buffer = pickle.loads(pickle.dumps(Lexer(text).tokenize()))
+        for _ in range(2):
+            it = Interpreter(Parser(buffer))
+            it.run()
+            assert it.GLOBAL_SCOPE == {'a': 2, 'b': -17.5}
+        with pytest.raises(Exception, match='Error parsing input'):
+            Parser(Lexer('BEGIN a := 2 b END.').tokenize()).parse()
+
+
+class TestParser:
+
+    def test_nodes_and_tokens_are_slotted(self):
+        tree = Parser(Lexer('BEGIN x := -(1 + y); END.')).parse()
+        assign, noop = tree.children
+        unary = assign.right
+        for obj in (tree, assign, noop, unary, unary.expr, unary.expr.left,
+                    assign.left, assign.op):
+            assert not hasattr(obj, '__dict__')
+        assert assign.token is assign.op and assign.op.value == ':='
+        assert unary.token is unary.op and unary.op.type == TokenType.MINUS
+        assert unary.expr.token.type == TokenType.PLUS
+
+    @staticmethod
+    def _shape(tree):
+        from tinypascal.parser import walk
+        return [(type(node).__name__, getattr(node, 'value', None),
+                 node.op.value if hasattr(node, 'op') else None)
+                for node in walk(tree)]
+
+    @pytest.mark.parametrize('expr', [
+        '1', '-x', '+ - + 2', 'a - b - c', '2 + 3 * 4 - 6 / 2',
+        '-(a + b) * -c / (1 - (2 - (3 - d)))', '((((7))))', '- (- (x)) * 2',
+        'a * b + c * d - e / f / g',
+    ])
+    def test_iterative_expressions_build_same_tree(self, expr):
+        text = 'BEGIN y := {}; z := y END.'.format(expr)
+        assert self._shape(Parser(Lexer(text), iterative=True).parse()) == \
+            self._shape(Parser(Lexer(text)).parse())
+
+    @pytest.mark.parametrize('expr', [
+        '1 +', '(1 + 2', '1 + 2)', '* 3', '()', 'a b', '1 + ;',
+    ])
+    def test_iterative_expressions_fail_alike(self, expr):
+        text = 'BEGIN y := {} END.'.format(expr)
+        with pytest.raises(Exception, match='Error parsing input'):
+            Parser(Lexer(text)).parse()
+        with pytest.raises(Exception, match='Error parsing input'):
+            Parser(Lexer(text), iterative=True).parse()
+
+    def test_iterative_expressions_nest_without_recursion(self):
+        depth = 100000
+        text = 'BEGIN y := {}x + {}1{} END.'.format(
+            '-' * depth, '(' * depth, ')' * depth
+        )
+        tree = Parser(Lexer(text, scanner='regex'), iterative=True).parse()
+        expr = tree.children[0].right
+        assert expr.right.value == 1
+        node = expr.left
+        for _ in range(depth):
+            node = node.expr
+        assert node.value == 'x'
+
+
+class TestNodeVisitor:
+
+    class NumCounter(NodeVisitor):
+        def __init__(self):
+            self.count = 0
+
+        def visit_BinOp(self, node):
+            self.visit(node.left)
+            self.visit(node.right)
+
+        def visit_Num(self, node):
+            self.count += 1
+
+    def test_dispatch_is_cached_per_visitor_class(self):
+        tree = Parser(Lexer('1 + 2 * 3')).expr()
+        counter = self.NumCounter()
+        counter.visit(tree)
+        assert counter.count == 3
+        assert set(cls.__name__ for cls in self.NumCounter._visitors) == {
+            'BinOp', 'Num'
+        }
+        assert self.NumCounter._visitors is not Interpreter._visitors
+
+    def test_generic_visit_for_unknown_node(self):
+        tree = Parser(Lexer('- 2')).expr()
+        with pytest.raises(Exception, match='No visit_UnaryOp method'):
+            self.NumCounter().visit(tree)
+
 
 class TestInterpreter:
 
+    @pytest.mark.parametrize('engine', ENGINES)
     @pytest.mark.parametrize('expression, result', [
         ('BEGIN x := 2+5; END.', 7),
         ('BEGIN x := 5 -2; END.', 3),
@@ -55,9 +280,9 @@ class TestInterpreter:
         ('BEGIN x := 99 / 9; END.', 11),
         ('BEGIN x := 2 + 2 - 1 * 6 / 2; END.', 1)
     ])
-    def test_expression_evaluation(self, expression, result):
+    def test_expression_evaluation(self, expression, result, engine):
         lxr = Lexer(expression)
-        it = Interpreter(Parser(lxr))
+        it = Interpreter(Parser(lxr), engine=engine)
         it.run()
         assert 'x' in it.GLOBAL_SCOPE and it.GLOBAL_SCOPE['x'] == result
 
@@ -83,7 +308,8 @@ class TestInterpreter:
             lxr.pos = 0
             Interpreter(Parser(lxr)).run()
 
-    def test_basic_pascal_code(self):
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_basic_pascal_code(self, engine):
         code = """
         BEGIN
             BEGIN
@@ -96,10 +322,765 @@ class TestInterpreter:
         END.
         """
         lxr = Lexer(code)
-        it = Interpreter(Parser(lxr))
+        it = Interpreter(Parser(lxr), engine=engine)
         it.run()
         assert 'number' in it.GLOBAL_SCOPE and it.GLOBAL_SCOPE['number'] == 2
         assert 'a' in it.GLOBAL_SCOPE and it.GLOBAL_SCOPE['a'] == 2
         assert 'b' in it.GLOBAL_SCOPE and it.GLOBAL_SCOPE['b'] == 25
         assert 'c' in it.GLOBAL_SCOPE and it.GLOBAL_SCOPE['c'] == 27
         assert 'x' in it.GLOBAL_SCOPE and it.GLOBAL_SCOPE['x'] == 11
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_scope_is_kept_up_to_failing_statement(self, engine):
+        it = Interpreter(Parser(Lexer('BEGIN a := 1; b := c; d := 2 END.')),
+                         engine=engine)
+        with pytest.raises(NameError):
+            it.run()
+        assert it.GLOBAL_SCOPE == {'a': 1}
+
+    def test_fails_for_unknown_engine(self):
+        with pytest.raises(ValueError):
+            Interpreter(Parser(Lexer('BEGIN END.')), engine='jit')
+
+
+class TestVM:
+
+    def test_compiles_to_flat_instructions(self):
+        from tinypascal.vm import compile_program
+        tree = Parser(Lexer('BEGIN x := -a * (2 + 3) END.')).parse()
+        assert compile_program(tree).dis().split('\n') == [
+            '   0 LOAD_SLOT        0 (a)',
+            '   1 UNARY_NEGATIVE',
+            '   2 LOAD_CONST       2',
+            '   3 LOAD_CONST       3',
+            '   4 BINARY_ADD',
+            '   5 BINARY_MULTIPLY',
+            '   6 STORE_SLOT       1 (x)',
+        ]
+
+    def test_bytecode_can_be_rerun(self):
+        from tinypascal.vm import compile_program
+        tree = Parser(Lexer('BEGIN y := x * x / 2 END.')).parse()
+        code = compile_program(tree)
+        for x in (1, 4, 7):
+            scope = {'x': x}
+            code.execute(scope)
+            assert scope == {'x': x, 'y': x * x / 2}
+
+    def test_slots_are_materialized_in_first_store_order(self):
+        from tinypascal.vm import VM, compile_program
+        tree = Parser(Lexer(
+            'BEGIN b := a; c := 1; a := c; b := 2; d := b / 0; e := 3 END.'
+        )).parse()
+        code = compile_program(tree)
+        assert code.names == ('a', 'b', 'c', 'd', 'e')
+        assert code.stores == (1, 2, 0, 3, 4)
+
+        scope = {'z': 0, 'a': 5}
+        with pytest.raises(ZeroDivisionError):
+            code.execute(scope)
+        assert list(scope.items()) == [('z', 0), ('a', 1), ('b', 2), ('c', 1)]
+
+        slots = code.bind({'a': 5})
+        with pytest.raises(ZeroDivisionError):
+            VM().run(code, slots)
+        assert slots == [1, 2, 1, None, None]
+        assert code.materialize(slots) == {'b': 2, 'c': 1, 'a': 1}
+
+
+class TestClosureCompiler:
+
+    def _run(self, code, **scope):
+        from tinypascal.closure import compile_program
+        program = compile_program(Parser(Lexer(code)).parse())
+        program.execute(scope)
+        return program, scope
+
+    def test_parenthesizes_only_where_needed(self):
+        program, scope = self._run(
+            'BEGIN x := (a - (b - 2)) * -(1 + 2) / (3 * 4) END.', a=9, b=4
+        )
+        assert "scope['x'] = (scope['a'] - (scope['b'] - 2)) * -(1 + 2) " \
+            "/ (3 * 4)" in program.source
+        assert scope['x'] == (9 - (4 - 2)) * -(1 + 2) / (3 * 4)
+
+    def test_large_constants_and_deep_expressions(self):
+        big = 10 ** 40
+        terms = ' - '.join(['a'] * 300)
+        nested = '(' * 150 + '1' + ' + 1)' * 150
+        code = 'BEGIN x := {} * {}; y := {}; z := {} END.'.format(
+            big, big, terms, nested
+        )
+        _, scope = self._run(code, a=3)
+        assert scope == {'a': 3, 'x': big * big, 'y': 3 - 3 * 299, 'z': 151}
+
+    def test_unbound_variable(self):
+        with pytest.raises(NameError, match="'b'"):
+            self._run('BEGIN a := 1; c := 1 + b END.')
+
+
+class TestStackEvaluator:
+
+    def test_evaluates_deep_trees(self):
+        depth = 100000
+        text = 'BEGIN a := 1; x := {}; y := {}a{} END.'.format(
+            ' + '.join(['a'] * depth), '-(' * depth, ')' * depth
+        )
+        it = Interpreter(Parser(Lexer(text, scanner='regex'), iterative=True),
+                         engine='stack')
+        it.run()
+        assert it.GLOBAL_SCOPE == {'a': 1, 'x': depth, 'y': 1}
+
+    def test_evaluation_order_matches_interpreter(self):
+        from tinypascal.stack import StackEvaluator
+        tree = Parser(Lexer('(1 / 0) + x')).expr()
+        with pytest.raises(ZeroDivisionError):
+            StackEvaluator().evaluate(tree)
+        tree = Parser(Lexer('x + (1 / 0)')).expr()
+        with pytest.raises(NameError, match="'x'"):
+            StackEvaluator().evaluate(tree)
+        assert StackEvaluator({'x': 4}).evaluate(
+            Parser(Lexer('-x * (2 - x) / +8')).expr()
+        ) == 1.0
+
+
+class TestBudget:
+
+    def _run(self, text, budget, engine):
+        it = Interpreter(Parser(Lexer(text)), engine=engine, budget=budget)
+        return it, it.run
+
+    @pytest.mark.parametrize('engine', ['tree', 'vm'])
+    def test_within_budget(self, engine):
+        from tinypascal.budget import Budget
+        it, run = self._run('BEGIN a := 2; b := a * a * a END.',
+                            Budget(max_steps=100, timeout=10, max_bits=8),
+                            engine)
+        run()
+        assert it.GLOBAL_SCOPE == {'a': 2, 'b': 8}
+
+    @pytest.mark.parametrize('engine', ['tree', 'vm'])
+    def test_step_limit(self, engine):
+        from tinypascal.budget import Budget, BudgetExceeded
+        text = 'BEGIN {} END.'.format(
+            '; '.join('x{} := {}'.format(i, i) for i in range(100))
+        )
+        it, run = self._run(text, Budget(max_steps=50), engine)
+        with pytest.raises(BudgetExceeded) as info:
+            run()
+        assert info.value.limit == 'steps'
+        assert info.value.stats['steps'] == 51
+        assert str(info.value) == 'steps budget exceeded after 51 steps'
+        # the statements run until then have been kept
+        assert 0 < len(it.GLOBAL_SCOPE) < 50
+        assert it.GLOBAL_SCOPE['x0'] == 0
+
+    @pytest.mark.parametrize('engine', ['tree', 'vm'])
+    def test_limits_whole_streams(self, engine):
+        from tinypascal.budget import Budget, BudgetExceeded
+        text = 'BEGIN {} END.'.format(
+            '; '.join('x{} := {}'.format(i, i) for i in range(2000))
+        )
+        it = Interpreter(Parser(Lexer(text)), engine=engine,
+                         budget=Budget(max_steps=100))
+        with pytest.raises(BudgetExceeded) as info:
+            it.run_stream()
+        assert info.value.stats['steps'] == 101
+        # each statement takes two steps
+        assert len(it.GLOBAL_SCOPE) == 50
+        assert it.meter is None
+
+    @pytest.mark.parametrize('engine', ['tree', 'vm'])
+    def test_bits_limit(self, engine):
+        from tinypascal.budget import Budget, BudgetExceeded
+        # each assignment squares a, the last would have 2 ** 20 bits
+        text = 'BEGIN a := 3; {} END.'.format('; '.join(['a := a * a'] * 20))
+        it, run = self._run(text, Budget(max_bits=1000), engine)
+        with pytest.raises(BudgetExceeded) as info:
+            run()
+        assert info.value.limit == 'bits'
+        assert it.GLOBAL_SCOPE['a'] == 3 ** 2 ** 9
+
+        it, run = self._run('BEGIN a := 255 + 1 - 1 END.',
+                            Budget(max_bits=8), engine)
+        with pytest.raises(BudgetExceeded, match='bits'):
+            run()
+
+    @pytest.mark.parametrize('engine', ['tree', 'vm'])
+    def test_time_limit(self, engine, monkeypatch):
+        from tinypascal import budget
+        clock = iter(range(1000))
+        monkeypatch.setattr(budget.time, 'monotonic', lambda: next(clock))
+        monkeypatch.setattr(budget, 'CLOCK_INTERVAL', 4)
+        text = 'BEGIN {} END.'.format('; '.join(['a := 1'] * 100))
+        it, run = self._run(text, budget.Budget(timeout=2.5), engine)
+        with pytest.raises(budget.BudgetExceeded) as info:
+            run()
+        assert info.value.limit == 'time'
+        assert info.value.stats == {'steps': 12, 'elapsed': 4}
+
+    def test_invalid_budgets(self):
+        from tinypascal.budget import Budget
+        with pytest.raises(ValueError, match='max_steps'):
+            Budget(max_steps=0)
+        it, run = self._run('BEGIN END.', Budget(max_steps=10), 'closure')
+        with pytest.raises(ValueError, match='closure'):
+            run()
+
+    def test_reported_by_evaluate(self):
+        from tinypascal.budget import Budget
+        from tinypascal.parallel import evaluate
+        result = evaluate('BEGIN a := 1; b := a + a END.', 'vm',
+                          budget=Budget(max_steps=3))
+        assert result.scope == {'a': 1}
+        assert result.error['type'] == 'BudgetExceeded'
+        assert result.error['limit'] == 'steps'
+        assert result.error['stats']['steps'] == 4
+
+
+class TestStreamingExecution:
+
+    def _statements(self, count):
+        yield 'BEGIN x0 := 1'
+        for i in range(1, count):
+            yield '; x{} := x{} + 1'.format(i % 10, (i - 1) % 10)
+        yield ' END.'
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_matches_run(self, engine):
+        it = Interpreter(Parser(Lexer(self._statements(25))), engine=engine)
+        it.run_stream()
+        expected = Interpreter(Parser(Lexer(''.join(self._statements(25)))))
+        expected.run()
+        assert it.GLOBAL_SCOPE == expected.GLOBAL_SCOPE
+
+    def test_statements_before_syntax_error_are_executed(self):
+        it = Interpreter(Parser(Lexer('BEGIN a := 1; b := 2 c := 3 END.')))
+        with pytest.raises(Exception, match='Error parsing input'):
+            it.run_stream()
+        assert it.GLOBAL_SCOPE == {'a': 1, 'b': 2}
+
+    def test_memory_does_not_grow_with_program_size(self):
+        import tracemalloc
+        peaks = []
+        for count in (1000, 10000):
+            it = Interpreter(Parser(Lexer(self._statements(count))))
+            tracemalloc.start()
+            it.run_stream()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            assert it.GLOBAL_SCOPE['x9'] == count
+        assert peaks[1] < peaks[0] * 2
+
+
+class TestConstantFolding:
+
+    def _fold(self, code):
+        from tinypascal.optimizer import fold_constants
+        return fold_constants(Parser(Lexer(code)).parse())
+
+    @pytest.mark.parametrize('code, removed', [
+        ('BEGIN x := 10 * 2 + 4 / 2 END.', 6),
+        ('BEGIN x := - - a * 1 + 0 END.', 6),
+        ('BEGIN x := 1 * (a - 0) + (0 + a) * (2 / 2) END.', 8),
+        ('BEGIN x := + - 2 * a END.', 2),
+        ('BEGIN x := 1 / 0 + a / 1 END.', 0),
+    ])
+    def test_folding_keeps_results(self, code, removed):
+        tree, count = self._fold(code)
+        assert count == removed
+
+        expected, folded = Interpreter(None), Interpreter(None)
+        for it, program in [(expected, Parser(Lexer(code)).parse()),
+                            (folded, tree)]:
+            it.GLOBAL_SCOPE['a'] = 7
+            try:
+                it.execute(program)
+            except ZeroDivisionError:
+                pass
+        assert folded.GLOBAL_SCOPE == expected.GLOBAL_SCOPE
+        assert type(folded.GLOBAL_SCOPE.get('x')) is \
+            type(expected.GLOBAL_SCOPE.get('x'))
+
+    def test_folds_to_num(self):
+        from tinypascal.parser import Num
+        tree, _ = self._fold('BEGIN x := 10 * 2 + 4 / 2 END.')
+        num = tree.children[0].right
+        assert isinstance(num, Num) and num.value == 22.0
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_interpreter_option(self, engine):
+        it = Interpreter(Parser(Lexer('BEGIN a := 2 * 3; b := a * 1 END.')),
+                         engine=engine, optimize=True)
+        it.run()
+        assert it.GLOBAL_SCOPE == {'a': 6, 'b': 6}
+        assert it.nodes_removed == 4
+
+
+class TestProgramCache:
+
+    CODE = """
+    BEGIN
+        BEGIN a := 2; b := -a * (3 - a / 4) END;
+        c := a + + 10000000000000000000000;
+    END.
+    """
+
+    def test_tree_serialization_roundtrip(self):
+        from tinypascal.cache import dump_tree, load_tree
+        tree = Parser(Lexer(self.CODE)).parse()
+        data = dump_tree(tree)
+        assert dump_tree(load_tree(data)) == data
+
+        expected, loaded = Interpreter(None), Interpreter(None)
+        expected.execute(tree)
+        loaded.execute(load_tree(data))
+        assert loaded.GLOBAL_SCOPE == expected.GLOBAL_SCOPE
+
+    def test_memory_tier_is_lru(self):
+        from tinypascal.cache import ProgramCache
+        cache = ProgramCache(maxsize=2)
+        first = cache.parse('BEGIN a := 1 END.')
+        cache.parse('BEGIN a := 2 END.')
+        assert cache.parse('BEGIN a := 1 END.') is first
+        cache.parse('BEGIN a := 3 END.')
+        cache.parse('BEGIN a := 2 END.')
+        assert (cache.hits, cache.misses) == (1, 4)
+        assert len(cache.entries) == 2
+
+    def test_compiled_programs_are_cached(self):
+        from tinypascal.cache import ProgramCache
+        cache = ProgramCache()
+        program = cache.compile(self.CODE, engine='vm')
+        assert cache.compile(self.CODE, engine='vm') is program
+        assert cache.compile(self.CODE, engine='vm', optimize=True) \
+            is not program
+        scope = {}
+        program.execute(scope)
+        assert scope['c'] == 10000000000000000000002
+
+    def test_disk_tier_survives_new_cache(self, tmp_path):
+        from tinypascal.cache import ProgramCache
+        ProgramCache(directory=str(tmp_path)).parse(self.CODE)
+        assert len(list(tmp_path.glob('*.tpc'))) == 1
+
+        cache = ProgramCache(directory=str(tmp_path))
+        cache.compile(self.CODE).execute({})
+        assert (cache.disk_hits, cache.misses) == (1, 0)
+
+    def test_disk_tier_follows_version(self, tmp_path):
+        from tinypascal.cache import ProgramCache
+        ProgramCache(directory=str(tmp_path)).parse(self.CODE)
+        cache = ProgramCache(directory=str(tmp_path))
+        cache._version = b'0.0.0'
+        cache.parse(self.CODE)
+        assert (cache.disk_hits, cache.misses) == (0, 1)
+
+
+class TestTypeInference:
+
+    def test_types_of_nodes_and_variables(self):
+        from tinypascal.inference import FLOAT, INT, UNKNOWN, infer_types
+        tree = Parser(Lexer(
+            'BEGIN a := 2 * x; b := a / 2; c := -a + 1; d := b * a; '
+            'e := a + y; a := 3 / 2 END.'
+        )).parse()
+        info = infer_types(tree, inputs={'x': INT})
+        assert info.variables == {
+            'a': FLOAT, 'b': FLOAT, 'c': INT, 'd': FLOAT, 'e': UNKNOWN
+        }
+        first = tree.children[0].right
+        assert info.type_of(first) == INT
+        assert info.type_of(first.right) == INT
+        assert info.type_of(tree.children[4].right.right) == UNKNOWN
+        assert not info.integer_only
+
+        info = infer_types(tree)
+        assert info.type_of(first) == UNKNOWN
+        assert info.variables['b'] == FLOAT
+
+    def test_integer_only_programs(self):
+        from tinypascal.inference import INT, infer_types
+        tree = Parser(Lexer('BEGIN y := x * x - 1; z := -y END.')).parse()
+        assert infer_types(tree, {'x': INT}).integer_only
+        assert not infer_types(tree).integer_only
+
+    def test_columns(self):
+        from array import array
+        from tinypascal.inference import (
+            FLOAT, INT, UNKNOWN, allocate_column, store
+        )
+        assert allocate_column(INT, 3) == array('q', [0, 0, 0])
+        assert allocate_column(FLOAT, 2) == array('d', [0.0, 0.0])
+        assert allocate_column(UNKNOWN, 2) == [0, 0]
+
+        column = allocate_column(INT, 2)
+        assert store(column, 0, 7) is column
+        column = store(column, 1, 2 ** 64)
+        assert column == [7, 2 ** 64]
+
+
+class TestBatchRunner:
+
+    CODE = 'BEGIN y := x * x - 1; z := y / (x + 1) END.'
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_runs_over_many_scopes(self, engine):
+        from tinypascal.batch import BatchRunner
+        runner = BatchRunner(self.CODE, engine=engine)
+        scopes = [{'x': x} for x in range(5)]
+        assert runner.run(scopes) == [
+            {'x': x, 'y': x * x - 1, 'z': (x * x - 1) / (x + 1)}
+            for x in range(5)
+        ]
+        assert scopes == [{'x': x} for x in range(5)]
+
+    def test_selected_variables_from_iterator(self):
+        from tinypascal.batch import BatchRunner
+        from tinypascal.cache import ProgramCache
+        runner = BatchRunner(self.CODE, cache=ProgramCache(), optimize=True)
+        results = runner.iter_run(({'x': x} for x in (1, 3)),
+                                  select=['z', 'w'])
+        assert list(results) == [{'z': 0.0, 'w': None}, {'z': 2.0, 'w': None}]
+
+    def test_runs_into_columns(self):
+        from array import array
+        from tinypascal.batch import BatchRunner
+        from tinypascal.inference import INT
+        runner = BatchRunner(self.CODE, engine='vm')
+        scopes = [{'x': 2 ** 32}, {'x': 1}, {'x': 3}]
+        columns = runner.run_columns(scopes, inputs={'x': INT})
+        assert columns == {
+            'y': [2 ** 64 - 1, 0, 8],
+            'z': array('d', [2 ** 32 - 1, 0.0, 2.0]),
+        }
+        columns = runner.run_columns(scopes[1:], {'x': INT}, select=['x', 'y'])
+        assert columns == {'x': array('q', [1, 3]), 'y': array('q', [0, 8])}
+        assert type(runner.run_columns(scopes[1:])['y']) is list
+
+    def test_runs_are_independent(self):
+        from tinypascal.batch import BatchRunner
+        tree = Parser(Lexer('BEGIN a := b END.')).parse()
+        runner = BatchRunner(tree, engine='vm')
+        assert runner.run([{'b': 1}]) == [{'a': 1, 'b': 1}]
+        with pytest.raises(NameError):
+            runner.run([{'c': 1}])
+
+    @pytest.mark.parametrize('delimiter, null', [('\n', []), ('\0', ['-0'])])
+    def test_batch_command_over_stdin(self, delimiter, null, monkeypatch,
+                                      capsys):
+        import io
+        import json
+        from tinypascal import main
+        programs = ['BEGIN a := 2 END.', '', 'BEGIN b := a END.',
+                    'BEGIN c := 1 / 2 END.']
+        monkeypatch.setattr('sys.stdin', io.StringIO(
+            delimiter.join(programs) + delimiter
+        ))
+        assert main(['batch', '--engine', 'vm'] + null) == 1
+        out, err = capsys.readouterr()
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [(line['index'], line['scope']) for line in lines] == [
+            (0, {'a': 2}), (1, {}), (2, {'c': 0.5})
+        ]
+        assert lines[1]['error'] == {'type': 'NameError', 'message': "'a'"}
+        assert all(line['elapsed'] >= 0 for line in lines)
+        assert '3 programs, 1 errors' in err
+
+    def test_batch_command_reports_unencodable_scopes(self, monkeypatch,
+                                                      capsys):
+        import io
+        import json
+        from tinypascal import main
+        # over 5000 digits, past the default limit on converting ints to str
+        big = 'BEGIN a := 99999999999999999999{} END.'.format(
+            '; a := a * a' * 8
+        )
+        monkeypatch.setattr('sys.stdin', io.StringIO(
+            big + '\nBEGIN x := 1 END.\n'
+        ))
+        assert main(['batch']) == 1
+        out, err = capsys.readouterr()
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [(line['index'], line['scope']) for line in lines] == [
+            (0, None), (1, {'x': 1})
+        ]
+        assert lines[0]['error']['type'] == 'ValueError'
+        assert '2 programs, 1 errors' in err
+
+    def test_batch_command_over_files(self, tmp_path, capsys):
+        import json
+        from tinypascal import main
+        (tmp_path / 'sub').mkdir()
+        (tmp_path / 'sub' / 'b.pas').write_text('BEGIN b := 1 END.')
+        (tmp_path / 'a.pas').write_text('BEGIN\n  a := 1\nEND.')
+        (tmp_path / 'notes.txt').write_text('BEGIN END.')
+        paths = [str(tmp_path), str(tmp_path / 'missing.pas')]
+        assert main(['batch', '-q'] + paths) == 1
+        out, err = capsys.readouterr()
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [line['path'] for line in lines] == [
+            str(tmp_path / 'a.pas'), str(tmp_path / 'sub' / 'b.pas'),
+            str(tmp_path / 'missing.pas')
+        ]
+        assert [line['scope'] for line in lines] == [{'a': 1}, {'b': 1}, None]
+        assert lines[2]['error']['type'] == 'FileNotFoundError'
+        assert err == ''
+
+
+class TestColumnarEvaluation:
+
+    CODE = """
+    BEGIN
+        y := a * b - - a;
+        z := (y + 1) / b + c;
+        w := 2 * 3;
+        v := a * a * a * a
+    END.
+    """
+
+    def _per_row(self, columns):
+        rows = []
+        for values in zip(*columns.values()):
+            it = Interpreter(Parser(Lexer(self.CODE)))
+            it.GLOBAL_SCOPE.update(
+                (name, value.item()) for name, value in
+                zip(columns, values)
+            )
+            it.run()
+            rows.append(it.GLOBAL_SCOPE)
+        return rows
+
+    @pytest.mark.parametrize('a', [
+        [1, -2, 3, 40000],
+        [2 ** 40, -2 ** 40, 7, 2 ** 62],
+    ])
+    def test_matches_per_row_interpreter(self, a):
+        np = pytest.importorskip('numpy')
+        from tinypascal.columnar import evaluate_columns
+        columns = {
+            'a': np.array(a, dtype=np.int64),
+            'b': np.array([3, 5, -7, 2 ** 55 + 1], dtype=np.int64),
+            'c': np.array([0.5, -1.25, 1e300, 3.0]),
+        }
+        tree = Parser(Lexer(self.CODE)).parse()
+        result = evaluate_columns(tree, columns)
+        for i, expected in enumerate(self._per_row(columns)):
+            for name, value in expected.items():
+                actual = result[name][i]
+                assert actual == value
+                assert isinstance(value, float) == \
+                    isinstance(actual, (float, np.floating))
+
+    def test_errors_match_interpreter(self):
+        np = pytest.importorskip('numpy')
+        from tinypascal.columnar import evaluate_columns
+        tree = Parser(Lexer('BEGIN x := a / b END.')).parse()
+        with pytest.raises(ZeroDivisionError):
+            evaluate_columns(tree, {'a': np.arange(3), 'b': np.arange(3)})
+        with pytest.raises(NameError, match="'b'"):
+            evaluate_columns(tree, {'a': np.arange(3)})
+
+    def test_invalid_divisions_are_silent(self):
+        import math
+        import warnings
+        np = pytest.importorskip('numpy')
+        from tinypascal.columnar import evaluate_columns
+        tree = Parser(Lexer('BEGIN x := a / b END.')).parse()
+        # the object column takes the exact, object array division
+        columns = {'a': np.array([np.inf, 1.0]),
+                   'b': np.array([np.inf, 2 ** 70], dtype=object)}
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            result = evaluate_columns(tree, columns)
+        assert math.isnan(result['x'][0]) and result['x'][1] == 2.0 ** -70
+
+
+class TestDataflow:
+
+    CODE = """
+    BEGIN
+        a := 1; b := 2;
+        BEGIN c := a + b; a := 10 END;
+        d := b * 3; b := c; e := a
+    END.
+    """
+
+    def test_dependency_levels(self):
+        from tinypascal.dataflow import DependencyGraph
+        graph = DependencyGraph.from_tree(Parser(Lexer(self.CODE)).parse())
+        assert [node.left.value for node in graph.statements] == [
+            'a', 'b', 'c', 'a', 'd', 'b', 'e'
+        ]
+        assert graph.depends == [
+            set(), set(), {0, 1}, {0, 2}, {1}, {1, 2, 4}, {3}
+        ]
+        assert graph.levels() == [[0, 1], [2, 4], [3, 5], [6]]
+
+    @pytest.mark.parametrize('max_workers', [None, 2])
+    @pytest.mark.parametrize('code', [
+        CODE,
+        'BEGIN a := 1; b := a / 0; c := 2; d := x END.',
+        'BEGIN a := 1; b := 2; c := a + x; d := b / 0 END.',
+        'BEGIN a := 1; b := 2; c := b / 0; d := x END.',
+    ])
+    def test_matches_sequential_execution(self, code, max_workers,
+                                          monkeypatch):
+        from tinypascal import dataflow
+        from tinypascal.dataflow import ScheduledProgram
+        # every statement goes to the workers when there are some
+        monkeypatch.setattr(dataflow, 'HEAVY_BITS', 0)
+        expected, actual = {'x0': 0}, {'x0': 0}
+        errors = []
+        for scope, program in [
+                (expected, Parser(Lexer(code)).parse()),
+                (actual, ScheduledProgram(Parser(Lexer(code)).parse(),
+                                          max_workers=max_workers))]:
+            it = Interpreter(None)
+            it.GLOBAL_SCOPE = scope
+            try:
+                if isinstance(program, ScheduledProgram):
+                    with program:
+                        program.execute(scope)
+                else:
+                    it.execute(program)
+            except Exception as ex:
+                errors.append(type(ex))
+        assert list(actual.items()) == list(expected.items())
+        assert errors[:1] == errors[1:]
+
+    def test_heavy_statements_run_on_processes(self):
+        from tinypascal.dataflow import HEAVY_BITS
+        from tinypascal.interpreter import compile_program
+        tree = Parser(Lexer(
+            'BEGIN b := a * a; c := a * 3; d := a + 1; e := b - c END.'
+        )).parse()
+        a = 3 ** HEAVY_BITS
+        with compile_program(tree, 'dataflow', max_workers=2) as program:
+            scope = {'a': 1}
+            program.execute(scope)
+            assert program.pool is None
+            scope = {'a': a}
+            program.execute(scope)
+            assert program.pool is not None
+        assert program.pool is None
+        assert scope == {'a': a, 'b': a * a, 'c': a * 3, 'd': a + 1,
+                         'e': a * a - a * 3}
+
+
+class TestBench:
+
+    @pytest.mark.parametrize('workload', [
+        'deep_expression', 'long_statements', 'many_variables',
+        'nested_blocks'
+    ])
+    def test_workloads_run_on_every_engine(self, workload):
+        from tinypascal.bench import WORKLOADS
+        generate, size = WORKLOADS[workload]
+        text = generate(min(size, 500))
+        expected = Interpreter(Parser(Lexer(text)))
+        expected.run()
+        for engine in ENGINES:
+            interpreter = Interpreter(Parser(Lexer(text)), engine=engine)
+            interpreter.run()
+            assert interpreter.GLOBAL_SCOPE == expected.GLOBAL_SCOPE
+
+    def test_run_reports_every_phase(self):
+        from tinypascal.bench import run
+        results = run(['many_variables'], scale=0.01, repeat=1)
+        result = results['workloads']['many_variables']
+        assert result['size'] == 50
+        assert result['tokens'] == 1 + 3 + 8 * 49 + 3
+        assert result['nodes'] == 1 + 3 + 7 * 49
+        assert result['peak_memory'] > 0
+        assert result['tokens_per_second'] > 0
+
+    def test_compare_flags_slower_phases(self):
+        from tinypascal.bench import compare
+        baseline = {'workloads': {
+            'a': {'size': 10, 'lex': 1.0, 'parse': 1.0, 'execute': 1.0},
+            'b': {'size': 10, 'lex': 1.0, 'parse': 1.0, 'execute': 1.0},
+        }}
+        results = {'workloads': {
+            'a': {'size': 10, 'lex': 1.05, 'parse': 1.5, 'execute': 0.5},
+            'b': {'size': 20, 'lex': 9.0, 'parse': 9.0, 'execute': 9.0},
+        }}
+        assert compare(results, baseline) == [('a', 'parse', 1.0, 1.5)]
+
+    def test_compare_refuses_other_settings(self, tmp_path, capsys):
+        from tinypascal.bench import compare, main, run
+        results = run(['many_variables'], scale=0.01, repeat=1)
+        assert compare(results, dict(results)) == []
+        for setting, value in [('engine', 'vm'), ('scanner', 'regex'),
+                               ('python', '2.7.18')]:
+            baseline = dict(results, **{setting: value})
+            with pytest.raises(ValueError, match=setting):
+                compare(results, baseline)
+
+        path = tmp_path / 'baseline.json'
+        assert main(['-w', 'many_variables', '--scale', '0.01',
+                     '--repeat', '1', '--engine', 'vm', '-o', str(path)]) == 0
+        assert main(['-w', 'many_variables', '--scale', '0.01',
+                     '--repeat', '1', '--baseline', str(path)]) == 2
+        assert "Baseline was run with engine 'vm', not 'tree'" in \
+            capsys.readouterr().err
+
+
+class TestProfiling:
+
+    CODE = 'BEGIN a := 2; b := a * (a + 3); BEGIN a := -b END END.'
+
+    def test_counts_tokens_nodes_and_visits(self):
+        from tinypascal.profiling import Profile, run_profiled
+        profile = Profile()
+        scope = run_profiled(self.CODE, profile, scope={'z': 1})
+        assert scope == {'z': 1, 'a': -10, 'b': 10}
+        assert profile.tokens['ID'] == 6
+        assert profile.tokens['BEGIN'] == profile.tokens['END'] == 2
+        assert profile.tokens['EOF'] == 1
+        assert dict(profile.nodes) == {
+            'Compound': 2, 'Assign': 3, 'Var': 6, 'Num': 2, 'BinOp': 2,
+            'UnaryOp': 1
+        }
+        assert profile.calls['Interpreter.visit_Assign'] == 3
+        assert profile.calls['Interpreter.visit_Var'] == 3
+        assert profile.calls['Parser.compound_statement'] == 2
+        assert profile.calls['lex'] == sum(profile.tokens.values())
+        assert profile.hottest(2) == [('a', 2, 2), ('b', 1, 1)]
+        assert set(profile.phases) == {'lex', 'parse', 'execute'}
+
+    def test_recursive_calls_count_once_in_cumulative_time(self):
+        from tinypascal.profiling import Profile, run_profiled
+        profile = Profile()
+        run_profiled(self.CODE, profile)
+        assert profile.cumulative['Interpreter.visit_Compound'] <= \
+            profile.phases['execute']
+        assert profile.cumulative['Parser.expr'] <= \
+            profile.cumulative['Parser.statement_list']
+
+    def test_exports(self):
+        import io
+        import json
+        from tinypascal.profiling import Profile, run_profiled
+        profile = Profile()
+        with pytest.raises(ZeroDivisionError):
+            run_profiled('BEGIN a := 1; b := a / 0 END.', profile)
+        data = json.loads(profile.to_json())
+        assert data['variables'] == [{'name': 'a', 'reads': 1, 'writes': 1}]
+        assert data['functions']['Interpreter.visit_BinOp']['calls'] == 1
+
+        output = io.StringIO()
+        profile.write_collapsed(output)
+        for line in output.getvalue().splitlines():
+            stack, microseconds = line.rsplit(' ', 1)
+            assert stack.split(';')[0] in ('parse', 'execute')
+            assert int(microseconds) > 0
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_other_engines_are_timed(self, engine):
+        from tinypascal.profiling import Profile, run_profiled
+        profile = Profile()
+        assert run_profiled(self.CODE, profile, engine=engine) == {
+            'a': -10, 'b': 10
+        }
+        assert profile.phases['execute'] > 0